@@ -0,0 +1,45 @@
+"""
+Shortcuts for filesystem manipulation.
+"""
+
+from pyiron_snippets.files.archive import (
+    ARCHIVE_CODECS,
+    ArchiveCodec,
+    ArchiveView,
+    ChecksumMismatchError,
+    VerificationReport,
+)
+from pyiron_snippets.files.batch import (
+    BatchResult,
+    compress_directories,
+    decompress_directories,
+)
+from pyiron_snippets.files.blob_store import BlobStore
+from pyiron_snippets.files.deletion import (
+    DeferredDeleter,
+    DeferredDeletionStats,
+    DeletionReport,
+    delete_files_and_directories_recursively,
+)
+from pyiron_snippets.files.directory import DirectoryObject
+from pyiron_snippets.files.locks import (
+    FileLock,
+    LockStats,
+)
+from pyiron_snippets.files.packing import PackedFiles
+from pyiron_snippets.files.sync import (
+    CloneReport,
+    SyncReport,
+)
+from pyiron_snippets.files.tree import (
+    DiskUsage,
+    FileRecord,
+    categorize_folder_items,
+    iter_folder_items,
+    iter_unique_directories,
+    measure_disk_usage,
+)
+from pyiron_snippets.files.watch import (
+    DirectoryWatcher,
+    WatchEvent,
+)
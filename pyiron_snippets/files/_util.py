@@ -0,0 +1,131 @@
+"""
+Small helpers shared by the modules of :mod:`pyiron_snippets.files`.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import io
+import os
+import re
+import sys
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, TypeVar
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+def _parallel_map(
+    func: Callable[[_T], _R], items: Iterable[_T], max_workers: int | None
+) -> list[_R]:
+    if max_workers is not None and max_workers <= 1:
+        return list(map(func, items))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, items))
+
+
+def _file_digest(path: str | Path, algorithm: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, algorithm).hexdigest()
+
+
+def _write_atomically(path: Path, text: str):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+def _as_bytes(content: str | bytes) -> bytes:
+    return content.encode() if isinstance(content, str) else content
+
+
+def _glob_matcher(patterns: str | Iterable[str] | None) -> Callable[[str], bool]:
+    """
+    Compile glob patterns into a single predicate on relative posix paths.
+
+    Patterns containing a "/" are matched against the whole path, others against
+    the last path component only.
+    """
+    if patterns is None:
+        return lambda _: False
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    path_patterns: list[str] = []
+    name_patterns: list[str] = []
+    for pattern in patterns:
+        (path_patterns if "/" in pattern else name_patterns).append(
+            fnmatch.translate(pattern)
+        )
+    match_path = re.compile("|".join(path_patterns)).match if path_patterns else None
+    match_name = re.compile("|".join(name_patterns)).match if name_patterns else None
+
+    def matches(relative_path: str) -> bool:
+        return bool(
+            (match_path is not None and match_path(relative_path))
+            or (match_name is not None and match_name(relative_path.rpartition("/")[2]))
+        )
+
+    return matches
+
+
+class _MemberReader(io.RawIOBase):
+    """Reads `size` bytes from a stream, closing it and its raw file at the end."""
+
+    def __init__(self, stream: BinaryIO, raw: io.IOBase, size: int):
+        super().__init__()
+        self._stream = stream
+        self._raw = raw
+        self._remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(min(len(buffer), self._remaining))
+        buffer[: len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+            self._raw.close()
+            super().close()
+
+
+def _fsync(path: str | Path):
+    """Flush a file or (on POSIX) a directory to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_FICLONE = 0x40049409
+
+
+def _reflink(source: str | Path, target: str | Path) -> bool:
+    """
+    Try to copy a file as a reflink (sharing the data on disk until either copy
+    is modified), which only some filesystems on Linux support.
+
+    Returns:
+        bool: Whether it worked. If not, `target` is not created.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    with open(source, "rb") as src, open(target, "xb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            return True
+        except OSError:
+            pass
+    os.unlink(target)
+    return False
@@ -0,0 +1,553 @@
+"""
+Tar archives of directories: codecs, member indices, manifests and views.
+"""
+
+from __future__ import annotations
+
+import bisect
+import bz2
+import collections
+import contextlib
+import dataclasses
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import math
+import os
+import tarfile
+import zlib
+from collections.abc import Callable, Iterator, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, cast
+
+from pyiron_snippets.files._util import _MemberReader
+
+
+@dataclasses.dataclass(frozen=True)
+class ArchiveCodec:
+    """
+    How to write the tar archives of :meth:`DirectoryObject.compress`.
+
+    Attributes:
+        suffix (str): The file suffix of the archives.
+        compressor (Callable | None): Takes the raw binary output file and a
+            compression level (None for the default) and returns a writable
+            compressed stream on top of it. A new stream is started every MiB,
+            so the archive can be read from there. None to write an uncompressed
+            tar.
+        block_compressor (Callable | None): Takes a block of data and a
+            compression level and returns it as a complete, self-contained
+            compressed member. Codecs whose decompressors read concatenated
+            members (like gzip, bzip2 and xz) can thus compress independent
+            blocks in parallel. None if the codec does not support this.
+        decompressor (Callable | None): Takes the raw binary archive file, and
+            returns a readable decompressed stream starting at its current
+            position. None for uncompressed tars.
+
+    Next to each archive, an index of the positions of the files in it is stored
+    for :class:`ArchiveView`.
+    """
+
+    suffix: str
+    compressor: Callable[[BinaryIO, int | None], BinaryIO] | None = None
+    block_compressor: Callable[[bytes, int | None], bytes] | None = None
+    decompressor: Callable[[BinaryIO], BinaryIO] | None = None
+
+    @contextlib.contextmanager
+    def open(
+        self, path: str | Path, level: int | None = None, workers: int = 1
+    ) -> Iterator[tarfile.TarFile]:
+        """
+        Open a new archive for writing.
+
+        Args:
+            path (str | Path): The archive file.
+            level (int | None): The compression level, None for the default.
+            workers (int): The number of threads compressing blocks of the tar
+                stream concurrently. (Default is 1, stream serially.)
+        """
+        if self.compressor is None and level is not None:
+            raise ValueError(
+                f"Archives with suffix {self.suffix} have no compression level"
+            )
+        if workers > 1 and self.block_compressor is None:
+            raise ValueError(
+                f"Archives with suffix {self.suffix} can't be compressed in parallel"
+            )
+        checkpoints = [(0, 0)]
+        with contextlib.ExitStack() as stack:
+            stream: BinaryIO = stack.enter_context(open(path, "wb"))
+            block_compressor = self.block_compressor
+            if block_compressor is not None and workers > 1:
+                writer = _BlockParallelWriter(
+                    stream, lambda block: block_compressor(block, level), workers
+                )
+                checkpoints = writer.checkpoints
+                stream = stack.enter_context(cast(BinaryIO, writer))
+            elif self.compressor is not None:
+                member_writer = _MemberWriter(
+                    stream, self.compressor, level, member_size=_BLOCK_SIZE
+                )
+                checkpoints = member_writer.checkpoints
+                stream = stack.enter_context(cast(BinaryIO, member_writer))
+            with _IndexingTarFile.open(fileobj=stream, mode="w") as tar:
+                yield tar
+                members = {
+                    m.name: (m.offset_data, m.size)
+                    for m in tar.getmembers()
+                    if m.isreg()
+                }
+        _write_archive_index(Path(path), checkpoints, members)
+
+
+def _manifest_name(algorithm: str) -> str:
+    return f".{algorithm}sums"
+
+
+def _format_manifest(digests: Mapping[str, str]) -> str:
+    """In the format of `sha256sum` and friends, so `sha256sum -c` can check it."""
+    return "".join(f"{digests[name]}  {name}\n" for name in sorted(digests))
+
+
+def _parse_manifest(text: str) -> dict[str, str]:
+    digests = {}
+    for line in text.splitlines():
+        digest, _, name = line.partition("  ")
+        digests[name] = digest
+    return digests
+
+
+class _IndexingTarFile(tarfile.TarFile):
+    """
+    A tar file recording the position of the members it writes, like
+    :class:`tarfile.TarFile` does for the members it reads.
+    """
+
+    def addfile(self, tarinfo, fileobj=None, **kwargs):
+        super().addfile(tarinfo, fileobj, **kwargs)
+        member = self.members[-1]
+        member.offset_data = (
+            self.offset - -(-member.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        )
+
+
+def _archive_index_path(tar_path: Path) -> Path:
+    return tar_path.with_name(tar_path.name + ".index")
+
+
+def _write_archive_index(
+    tar_path: Path,
+    checkpoints: list[tuple[int, int]],
+    members: dict[str, tuple[int, int]],
+):
+    _archive_index_path(tar_path).write_text(
+        json.dumps({"checkpoints": checkpoints, "members": members})
+    )
+
+
+_BLOCK_SIZE = 2**20
+"""The uncompressed size of the independently compressed members of archives."""
+
+
+class _BlockParallelWriter(io.RawIOBase):
+    """
+    A write-only stream cutting its input into blocks, which are compressed
+    independently on a thread pool and written out in order.
+
+    At most two blocks per worker are in flight, bounding the memory use.
+    """
+
+    def __init__(
+        self,
+        raw: BinaryIO,
+        compress_block: Callable[[bytes], bytes],
+        workers: int,
+        block_size: int = _BLOCK_SIZE,
+    ):
+        super().__init__()
+        self._raw = raw
+        self._compress_block = compress_block
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._max_in_flight = 2 * workers
+        self._in_flight: collections.deque[tuple[int, Future[bytes]]] = (
+            collections.deque()
+        )
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._position = 0
+        self._submitted = 0
+        self.checkpoints: list[tuple[int, int]] = []
+        """The uncompressed and compressed offsets at which each member starts."""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        n_bytes = memoryview(data).nbytes
+        self._buffer += data
+        self._position += n_bytes
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[: self._block_size]))
+            del self._buffer[: self._block_size]
+        return n_bytes
+
+    def tell(self) -> int:
+        return self._position
+
+    def _submit(self, block: bytes):
+        future = self._executor.submit(self._compress_block, block)
+        self._in_flight.append((self._submitted, future))
+        self._submitted += len(block)
+        while len(self._in_flight) > self._max_in_flight:
+            self._write_oldest()
+
+    def _write_oldest(self):
+        uncompressed_offset, future = self._in_flight.popleft()
+        self.checkpoints.append((uncompressed_offset, self._raw.tell()))
+        self._raw.write(future.result())
+
+    def flush(self):
+        if self.closed:
+            return
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._in_flight:
+            self._write_oldest()
+        self._raw.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+            super().close()
+
+
+class _MemberWriter(io.RawIOBase):
+    """
+    A write-only stream compressing its input as a series of independent members,
+    a new one starting after each call to :meth:`end_member` -- and, with a
+    `member_size`, as soon as a member holds this many uncompressed bytes.
+    """
+
+    def __init__(
+        self,
+        raw: BinaryIO,
+        compressor: Callable[[BinaryIO, int | None], BinaryIO] | None,
+        level: int | None,
+        position: int = 0,
+        member_size: int | None = None,
+    ):
+        super().__init__()
+        self._raw = raw
+        self._compressor = compressor
+        self._level = level
+        self._stream: BinaryIO | None = None
+        self._position = position
+        self._member_size = member_size
+        self._member_start = position
+        self.checkpoints: list[tuple[int, int]] = []
+        """The uncompressed and compressed offsets at which each member starts."""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self._stream is None:
+            self.checkpoints.append((self._position, self._raw.tell()))
+            self._member_start = self._position
+            self._stream = (
+                self._raw
+                if self._compressor is None
+                else self._compressor(self._raw, self._level)
+            )
+        n_bytes = memoryview(data).nbytes
+        self._stream.write(data)
+        self._position += n_bytes
+        if (
+            self._member_size is not None
+            and self._position - self._member_start >= self._member_size
+        ):
+            self.end_member()
+        return n_bytes
+
+    def tell(self) -> int:
+        return self._position
+
+    def end_member(self):
+        if self._stream is not None and self._stream is not self._raw:
+            self._stream.close()
+        self._stream = None
+        self._raw.flush()
+
+    def close(self):
+        if not self.closed:
+            self.end_member()
+            super().close()
+
+
+def _gzip_compressor(raw: BinaryIO, level: int | None) -> BinaryIO:
+    return cast(
+        BinaryIO,
+        gzip.GzipFile(
+            fileobj=raw, mode="wb", compresslevel=9 if level is None else level
+        ),
+    )
+
+
+def _gzip_block_compressor(block: bytes, level: int | None) -> bytes:
+    return zlib.compress(block, 9 if level is None else level, wbits=31)
+
+
+def _gzip_decompressor(raw: BinaryIO) -> BinaryIO:
+    return cast(BinaryIO, gzip.GzipFile(fileobj=raw, mode="rb"))
+
+
+def _bz2_compressor(raw: BinaryIO, level: int | None) -> BinaryIO:
+    return cast(
+        BinaryIO, bz2.BZ2File(raw, "wb", compresslevel=9 if level is None else level)
+    )
+
+
+def _bz2_block_compressor(block: bytes, level: int | None) -> bytes:
+    return bz2.compress(block, 9 if level is None else level)
+
+
+def _bz2_decompressor(raw: BinaryIO) -> BinaryIO:
+    return cast(BinaryIO, bz2.BZ2File(raw, "rb"))
+
+
+def _xz_compressor(raw: BinaryIO, level: int | None) -> BinaryIO:
+    return cast(BinaryIO, lzma.LZMAFile(raw, "wb", preset=level))
+
+
+def _xz_block_compressor(block: bytes, level: int | None) -> bytes:
+    return lzma.compress(block, preset=level)
+
+
+def _xz_decompressor(raw: BinaryIO) -> BinaryIO:
+    return cast(BinaryIO, lzma.LZMAFile(raw, "rb"))
+
+
+ARCHIVE_CODECS: dict[str, ArchiveCodec] = {
+    "gzip": ArchiveCodec(
+        ".tar.gz", _gzip_compressor, _gzip_block_compressor, _gzip_decompressor
+    ),
+    "bz2": ArchiveCodec(
+        ".tar.bz2", _bz2_compressor, _bz2_block_compressor, _bz2_decompressor
+    ),
+    "xz": ArchiveCodec(
+        ".tar.xz", _xz_compressor, _xz_block_compressor, _xz_decompressor
+    ),
+    "tar": ArchiveCodec(".tar"),
+}
+
+
+try:
+    from compression import zstd  # Python >= 3.14
+
+    def _zstd_compressor(raw: BinaryIO, level: int | None) -> BinaryIO:
+        return cast(BinaryIO, zstd.ZstdFile(raw, "wb", level=level))
+
+    def _zstd_block_compressor(block: bytes, level: int | None) -> bytes:
+        return zstd.compress(block, level=level)
+
+    def _zstd_decompressor(raw: BinaryIO) -> BinaryIO:
+        return cast(BinaryIO, zstd.ZstdFile(raw, "rb"))
+
+    ARCHIVE_CODECS["zstd"] = ArchiveCodec(
+        ".tar.zst", _zstd_compressor, _zstd_block_compressor, _zstd_decompressor
+    )
+except ImportError:
+    pass
+
+
+def _file_codecs() -> Iterator[tuple[str, ArchiveCodec]]:
+    """The suffix and codec of each way to compress single files, e.g. ".gz"."""
+    for codec in ARCHIVE_CODECS.values():
+        if codec.decompressor is not None:
+            yield codec.suffix.removeprefix(".tar"), codec
+
+
+def _get_archive_codec(codec: str) -> ArchiveCodec:
+    try:
+        return ARCHIVE_CODECS[codec]
+    except KeyError:
+        raise ValueError(
+            f"Unknown codec {codec!r}, please choose from {list(ARCHIVE_CODECS)}"
+        ) from None
+
+
+class ArchiveView:
+    """
+    Read-only access to single files of a :meth:`DirectoryObject.compress`
+    archive, without extracting it.
+
+    Lookups go through the member index stored next to the archive (which is
+    built with one pass over the archive if it is missing). Reading a member
+    seeks straight to the closest preceding independently compressed member and
+    decompresses from there -- i.e. practically directly for uncompressed
+    archives and archives written with `streaming=True`, and from at most a MiB
+    before the file otherwise. (If the index has to be rebuilt, archives are
+    decompressed from the start.)
+
+    Args:
+        tar_path (str | Path): The archive.
+    """
+
+    def __init__(self, tar_path: str | Path):
+        self.path = Path(tar_path)
+        codec = next(
+            (
+                codec
+                for codec in ARCHIVE_CODECS.values()
+                if self.path.name.endswith(codec.suffix)
+            ),
+            None,
+        )
+        if codec is None:
+            raise ValueError(
+                f"{self.path} is not an archive, please use one of the suffixes "
+                f"{[codec.suffix for codec in ARCHIVE_CODECS.values()]}"
+            )
+        self._codec = codec
+        index_path = _archive_index_path(self.path)
+        if not index_path.exists():
+            with tarfile.open(self.path, "r:*") as tar:
+                members = {m.name: (m.offset_data, m.size) for m in tar if m.isreg()}
+            _write_archive_index(self.path, [(0, 0)], members)
+        index = json.loads(index_path.read_text())
+        self._checkpoints = [tuple(c) for c in index["checkpoints"]]
+        self._members = index["members"]
+
+    def list(self) -> list[str]:
+        """The (posix) paths of the files in the archive."""
+        return list(self._members)
+
+    def __contains__(self, name: str | Path) -> bool:
+        return Path(name).as_posix() in self._members
+
+    def open(self, name: str | Path) -> BinaryIO:
+        """
+        Open a file of the archive for binary reading.
+
+        Args:
+            name (str | Path): The path of the file relative to the directory.
+
+        Returns:
+            BinaryIO: The readable content of the file.
+        """
+        try:
+            offset, size = self._members[Path(name).as_posix()]
+        except KeyError:
+            raise FileNotFoundError(f"{name} is not in {self.path}") from None
+        i = bisect.bisect_right(self._checkpoints, (offset, math.inf)) - 1
+        uncompressed_offset, compressed_offset = self._checkpoints[i]
+        with contextlib.ExitStack() as stack:
+            raw = stack.enter_context(open(self.path, "rb"))
+            if self._codec.decompressor is None:
+                raw.seek(compressed_offset + offset - uncompressed_offset)
+                stream = cast(BinaryIO, raw)
+            else:
+                raw.seek(compressed_offset)
+                stream = self._codec.decompressor(cast(BinaryIO, raw))
+                stream.seek(offset - uncompressed_offset)
+            reader = _MemberReader(stream, raw, size)
+            stack.pop_all()
+        return cast(BinaryIO, io.BufferedReader(reader))
+
+    def read_bytes(self, name: str | Path) -> bytes:
+        """The content of a file of the archive."""
+        with self.open(name) as f:
+            return f.read()
+
+
+@dataclasses.dataclass(frozen=True)
+class VerificationReport:
+    """
+    The outcome of :meth:`DirectoryObject.verify`.
+
+    Attributes:
+        mismatched (tuple[str, ...]): The files whose content changed.
+        missing (tuple[str, ...]): The files in the manifest which are gone.
+    """
+
+    mismatched: tuple[str, ...] = ()
+    missing: tuple[str, ...] = ()
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatched and not self.missing
+
+
+class ChecksumMismatchError(ValueError):
+    """Extracted files don't match the checksums stored with their archive."""
+
+    def __init__(self, message: str, mismatched: list[str]):
+        super().__init__(message, mismatched)  # All arguments, to unpickle
+        self.mismatched = mismatched
+
+    def __str__(self) -> str:
+        return self.args[0]
+
+
+def _extract_verified(tar: tarfile.TarFile, path: Path):
+    """
+    Extract an archive, hashing the files while they are streamed out if its
+    first member is a checksum manifest.
+
+    Raises:
+        ChecksumMismatchError: If any file does not match its checksum.
+    """
+    algorithm = None
+    expected: dict[str, str] = {}
+    mismatched = []
+    for i, member in enumerate(tar):
+        if i == 0 and member.isfile():
+            algorithm = next(
+                (
+                    a
+                    for a in hashlib.algorithms_available
+                    if member.name == _manifest_name(a)
+                ),
+                None,
+            )
+            if algorithm is not None:
+                expected = _parse_manifest(
+                    cast(BinaryIO, tar.extractfile(member)).read().decode()
+                )
+        if algorithm is None or member.name not in expected or not member.isfile():
+            tar.extract(member, path=path, filter="fully_trusted")
+            continue
+        target = path / member.name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.new(algorithm)
+        with cast(BinaryIO, tar.extractfile(member)) as source, target.open("wb") as f:
+            while chunk := source.read(2**20):
+                digest.update(chunk)
+                f.write(chunk)
+        os.chmod(target, member.mode)
+        os.utime(target, (member.mtime, member.mtime))
+        if digest.hexdigest() != expected[member.name]:
+            mismatched.append(member.name)
+    if mismatched:
+        raise ChecksumMismatchError(
+            f"{len(mismatched)} extracted file(s) don't match their checksums, the "
+            f"archive is kept: {mismatched}",
+            mismatched,
+        )
+
+
+def _find_archive(path: Path) -> Path | None:
+    directory = path.resolve()
+    for archive_codec in ARCHIVE_CODECS.values():
+        tar_path = directory.with_suffix(archive_codec.suffix)
+        if tar_path.exists():
+            return tar_path
+    return None
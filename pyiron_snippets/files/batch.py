@@ -0,0 +1,182 @@
+"""
+Compressing and decompressing many directories in parallel processes.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import pickle
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Literal, cast
+
+from pyiron_snippets.files.archive import _find_archive
+from pyiron_snippets.files.directory import DirectoryObject
+
+
+@dataclasses.dataclass(frozen=True)
+class BatchResult:
+    """
+    The outcome for one directory of :func:`compress_directories` or
+    :func:`decompress_directories`.
+
+    Attributes:
+        path (Path): The directory.
+        status (str): "done", "skipped" (if there was nothing to do) or "failed".
+        error (BaseException | None): What went wrong, if it failed.
+    """
+
+    path: Path
+    status: Literal["done", "skipped", "failed"]
+    error: BaseException | None = None
+
+
+def compress_directories(
+    directories: Iterable[DirectoryObject | str | Path],
+    max_workers: int | None = None,
+    progress: Callable[[int, int, BatchResult], None] | None = None,
+    **kwargs,
+) -> list[BatchResult]:
+    """
+    Compress many directories in parallel on a process pool.
+
+    Directories which already have an archive are skipped (unless they have an
+    interrupted streaming compression to resume).
+
+    Args:
+        directories (Iterable[DirectoryObject | str | Path]): What to compress.
+        max_workers (int | None): The number of processes. (Default is None,
+            let :class:`concurrent.futures.ProcessPoolExecutor` decide.)
+        progress (Callable | None): Called after each directory with the number
+            of finished directories, the total number and the result.
+        **kwargs: Passed on to :meth:`DirectoryObject.compress`.
+
+    Returns:
+        list[BatchResult]: The result for each directory, in order.
+    """
+    return _run_batch(
+        _compress_directory,
+        lambda path: (
+            _find_archive(path) is not None
+            and not path.resolve().with_suffix(".tar.journal").exists()
+        ),
+        directories,
+        max_workers,
+        progress,
+        kwargs,
+    )
+
+
+def decompress_directories(
+    directories: Iterable[DirectoryObject | str | Path],
+    max_workers: int | None = None,
+    progress: Callable[[int, int, BatchResult], None] | None = None,
+) -> list[BatchResult]:
+    """
+    Decompress many directories in parallel on a process pool.
+
+    Directories without an archive are skipped.
+
+    Args:
+        directories (Iterable[DirectoryObject | str | Path]): What to decompress.
+        max_workers (int | None): The number of processes. (Default is None,
+            let :class:`concurrent.futures.ProcessPoolExecutor` decide.)
+        progress (Callable | None): Called after each directory with the number
+            of finished directories, the total number and the result.
+
+    Returns:
+        list[BatchResult]: The result for each directory, in order.
+    """
+    return _run_batch(
+        _decompress_directory,
+        lambda path: (
+            _find_archive(path) is None
+            and not path.resolve().with_suffix(".tar.journal").exists()
+        ),
+        directories,
+        max_workers,
+        progress,
+        {},
+    )
+
+
+def _compress_directory(path: str, kwargs: dict) -> BaseException | None:
+    return _catch_picklable(
+        lambda: DirectoryObject(
+            path, generate_unique_directory=False, protected=True
+        ).compress(**kwargs)
+    )
+
+
+def _decompress_directory(path: str, kwargs: dict) -> BaseException | None:
+    return _catch_picklable(
+        lambda: DirectoryObject(
+            path, generate_unique_directory=False, protected=True
+        ).decompress(**kwargs)
+    )
+
+
+def _catch_picklable(work: Callable[[], object]) -> BaseException | None:
+    """
+    Run work in a worker process, returning (instead of raising) what went wrong.
+
+    The error is sent back to the parent process, so errors which can't make the
+    round trip through pickle are replaced by a :class:`RuntimeError` naming
+    them -- a single one must never break the pool for all other directories.
+    """
+    try:
+        work()
+    except Exception as e:
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            return RuntimeError(f"{type(e).__name__}: {e}")
+        return e
+    return None
+
+
+def _run_batch(
+    work: Callable[[str, dict], BaseException | None],
+    skip: Callable[[Path], bool],
+    directories: Iterable[DirectoryObject | str | Path],
+    max_workers: int | None,
+    progress: Callable[[int, int, BatchResult], None] | None,
+    kwargs: dict,
+) -> list[BatchResult]:
+    paths = [d.path if isinstance(d, DirectoryObject) else Path(d) for d in directories]
+    results: list[BatchResult | None] = [None] * len(paths)
+    n_finished = 0
+
+    def finish(i: int, result: BatchResult):
+        nonlocal n_finished
+        results[i] = result
+        n_finished += 1
+        if progress is not None:
+            progress(n_finished, len(paths), result)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for i, path in enumerate(paths):
+            if not path.is_dir():
+                finish(
+                    i,
+                    BatchResult(
+                        path, "failed", FileNotFoundError(f"{path} is no directory")
+                    ),
+                )
+            elif skip(path):
+                finish(i, BatchResult(path, "skipped"))
+            else:
+                futures[executor.submit(work, str(path.resolve()), kwargs)] = i
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                error = future.result()
+            except Exception as e:  # E.g. the worker process died
+                error = e
+            if error is None:
+                finish(i, BatchResult(paths[i], "done"))
+            else:
+                finish(i, BatchResult(paths[i], "failed", error))
+    return cast(list[BatchResult], results)
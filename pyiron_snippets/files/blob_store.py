@@ -0,0 +1,162 @@
+"""
+Content-addressed storage of file contents, shared across directories.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+from pyiron_snippets.files._util import _file_digest, _fsync, _reflink
+from pyiron_snippets.files.deletion import DeletionReport
+
+
+class BlobStore:
+    """
+    A content-addressed store of file contents, shared across directories.
+
+    Each distinct content is stored once, read-only, under the SHA-256 hex digest
+    of its bytes (as `objects/<first two digits>/<other digits>`), and
+    materialized in directories as hard links to it -- or, where hard links are
+    impossible (e.g. across filesystems), as reflinks or plain copies.
+
+    Hard links make the link count of a blob its reference count, so references
+    disappear however the linked files are removed, and :meth:`gc` deletes
+    exactly the blobs without any. Reflinks and copies are independent of their
+    blob and don't count as references.
+
+    Args:
+        root (str | Path): Where to keep the blobs.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self._objects = self.root / "objects"
+        self._tmp = self.root / "tmp"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._tmp.mkdir(exist_ok=True)
+
+    def blob_path(self, digest: str) -> Path:
+        return self._objects / digest[:2] / digest[2:]
+
+    def __contains__(self, digest: str) -> bool:
+        return self.blob_path(digest).exists()
+
+    def put_bytes(self, content: bytes, fsync: bool = False) -> str:
+        """
+        Store some content.
+
+        Args:
+            content (bytes): The content.
+            fsync (bool): Make sure the blob is on disk before returning. (Default
+                is False.)
+
+        Returns:
+            str: The digest of the content.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        if digest not in self:
+            tmp_path = self._tmp_path()
+            with tmp_path.open("wb") as f:
+                f.write(content)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._commit(tmp_path, digest, fsync)
+        elif fsync:  # Whoever stored it might not have synced it
+            _fsync(self.blob_path(digest))
+        return digest
+
+    def put_file(self, path: str | Path) -> str:
+        """
+        Store the content of a file and replace the file by a link to its blob.
+
+        On the same filesystem, the file itself becomes the blob if the content
+        is new, so nothing is copied.
+
+        Returns:
+            str: The digest of the content.
+        """
+        digest = _file_digest(path, "sha256")
+        if digest not in self:
+            tmp_path = self._tmp_path()
+            try:
+                os.link(path, tmp_path)
+            except OSError:
+                shutil.copyfile(path, tmp_path)
+            self._commit(tmp_path, digest)
+        if not os.path.samefile(path, self.blob_path(digest)):
+            self.materialize(digest, path)
+        return digest
+
+    def materialize(self, digest: str, target: str | Path, fsync: bool = False) -> str:
+        """
+        (Atomically) put the content of a blob at a path.
+
+        Args:
+            digest (str): The content.
+            target (str | Path): Where to put it, an existing file is replaced.
+            fsync (bool): Make sure copied content is on disk before it is put in
+                place; the directory of `target` is left to the caller. (Default
+                is False.)
+
+        Returns:
+            str: How the content was materialized: "hardlink", "reflink" or
+                "copy".
+        """
+        blob = self.blob_path(digest)
+        target = Path(target)
+        tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            os.link(blob, tmp_path)
+            strategy = "hardlink"
+        except OSError:
+            strategy = "reflink" if _reflink(blob, tmp_path) else "copy"
+            if strategy == "copy":
+                shutil.copyfile(blob, tmp_path)
+            if fsync:
+                _fsync(tmp_path)
+        os.replace(tmp_path, target)
+        return strategy
+
+    def refcount(self, digest: str) -> int:
+        """The number of hard links to a blob, apart from the blob itself."""
+        return os.stat(self.blob_path(digest)).st_nlink - 1
+
+    def gc(self) -> DeletionReport:
+        """
+        Delete all blobs which are not linked to from anywhere.
+
+        Returns:
+            DeletionReport: The number and size of the removed blobs.
+        """
+        n_files = n_bytes = 0
+        with os.scandir(self._objects) as shards:
+            for shard in shards:
+                with os.scandir(shard.path) as blobs:
+                    for blob in blobs:
+                        stat_result = blob.stat(follow_symlinks=False)
+                        if stat_result.st_nlink == 1:
+                            os.unlink(blob.path)
+                            n_files += 1
+                            n_bytes += stat_result.st_size
+        return DeletionReport(files=n_files, bytes=n_bytes)
+
+    def _tmp_path(self) -> Path:
+        return self._tmp / uuid.uuid4().hex
+
+    def _commit(self, tmp_path: Path, digest: str, fsync: bool = False):
+        os.chmod(tmp_path, 0o444)
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(exist_ok=True)
+        try:
+            os.link(tmp_path, blob)
+        except FileExistsError:  # Somebody else stored it in the meantime
+            pass
+        finally:
+            tmp_path.unlink()
+        if fsync and os.name == "posix":
+            _fsync(blob.parent)
@@ -0,0 +1,342 @@
+"""
+Deleting directory trees, right away or in the background.
+"""
+
+from __future__ import annotations
+
+import atexit
+import dataclasses
+import errno
+import os
+import queue
+import re
+import threading
+import uuid
+import weakref
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Literal
+
+from pyiron_snippets.files._util import _parallel_map
+
+
+@dataclasses.dataclass(frozen=True)
+class DeletionReport:
+    """What was removed by :func:`delete_files_and_directories_recursively`."""
+
+    files: int = 0
+    directories: int = 0
+    bytes: int = 0
+
+    @property
+    def entries(self) -> int:
+        return self.files + self.directories
+
+
+def delete_files_and_directories_recursively(
+    path: str | Path, max_workers: int | None = 1
+) -> DeletionReport:
+    """
+    Remove a directory tree (or a single file).
+
+    The tree is walked exactly once, top-down with :func:`os.scandir` and without
+    following symlinks. Then all files are unlinked and finally the directories are
+    removed, deepest level first. With more than one worker the unlinks (and the
+    removal of each directory level) are fanned out to a thread pool, which hides
+    the per-call latency of network filesystems.
+
+    Args:
+        path (str | Path): What to delete. Nothing happens if it does not exist.
+        max_workers (int | None): The number of threads to delete with. (Default is
+            1, delete serially in the calling thread; None lets
+            :class:`concurrent.futures.ThreadPoolExecutor` choose.)
+
+    Returns:
+        DeletionReport: The number of files, directories and bytes removed.
+    """
+    path = Path(path)
+    if not os.path.lexists(path):
+        return DeletionReport()
+    if path.is_symlink() or not path.is_dir():
+        return DeletionReport(files=1, bytes=_unlink(str(path)))
+    files, levels = _scan_tree(str(path))
+    sizes = _parallel_map(_unlink, files, max_workers)
+    for level in reversed(levels):
+        _parallel_map(os.rmdir, level, max_workers)
+    return DeletionReport(
+        files=len(files),
+        directories=sum(len(level) for level in levels),
+        bytes=sum(sizes),
+    )
+
+
+def _scan_tree(root: str) -> tuple[list[str], list[list[str]]]:
+    """All non-directories below `root`, and all directories grouped by depth."""
+    files: list[str] = []
+    levels: list[list[str]] = []
+    level = [root]
+    while level:
+        levels.append(level)
+        level = []
+        for directory in levels[-1]:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        level.append(entry.path)
+                    else:
+                        files.append(entry.path)
+    return files, levels
+
+
+def _unlink(path: str) -> int:
+    try:
+        size = os.lstat(path).st_size
+        os.unlink(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+@dataclasses.dataclass(frozen=True)
+class DeferredDeletionStats:
+    """Statistics of a :class:`DeferredDeleter`."""
+
+    pending: int
+    deleted: int
+    bytes_freed: int
+    errors: int
+
+
+_TRASH_SUFFIX = ".trash_"
+_TRASH_NAME = re.compile(r".+\.trash_[0-9a-f]{32}")
+
+
+def _iter_trash(directory: Path, hidden: bool) -> Iterator[Path]:
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if _TRASH_NAME.fullmatch(entry.name) and (
+                    not hidden or entry.name.startswith(".")
+                ):
+                    yield Path(entry.path)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+
+
+class DeferredDeleter:
+    """
+    Removes directory trees on a background thread.
+
+    Submitted directories are first atomically renamed out of the way -- so their
+    original path is free again immediately -- and then deleted by a single worker
+    thread, so that large trees don't stall the submitting thread.
+
+    By default, the renamed trees stay next to the original as hidden
+    `.<name>.trash_<uuid>` siblings until they are removed; a dedicated `trash`
+    directory can be used instead, as long as it is on the same filesystem (where
+    it is not, the sibling location is used as a fallback).
+
+    To have unprotected :class:`DirectoryObject` instances deleted in the
+    background when they are garbage collected, assign an instance to
+    :attr:`DirectoryObject.deferred_deleter`.
+
+    Args:
+        trash (str | Path | None): Where to move trees before deleting them.
+        max_workers (int | None): Threads used to delete each tree, see
+            :func:`delete_files_and_directories_recursively`. (Default is 1.)
+        at_exit (str): What to do with pending deletions when the interpreter
+            exits: "drain" waits for them to finish, "abandon" leaves the renamed
+            trees behind for :meth:`sweep`. (Default is "drain".)
+    """
+
+    def __init__(
+        self,
+        trash: str | Path | None = None,
+        max_workers: int | None = 1,
+        at_exit: Literal["drain", "abandon"] = "drain",
+    ):
+        if at_exit not in ("drain", "abandon"):
+            raise ValueError(
+                f"at_exit must be 'drain' or 'abandon', but got {at_exit!r}"
+            )
+        self.trash = None if trash is None else Path(trash)
+        self.max_workers = max_workers
+        self.at_exit = at_exit
+        # SimpleQueue and an RLock, because submissions may come from `__del__`
+        self._queue: queue.SimpleQueue[Path | None] = queue.SimpleQueue()
+        self._condition = threading.Condition(threading.RLock())
+        self._worker: threading.Thread | None = None
+        self._closed = False
+        self._pending = 0
+        self._queued: set[Path] = set()
+        self._deleted = 0
+        self._bytes_freed = 0
+        self._errors = 0
+        _open_deleters.add(self)
+
+    def submit(self, path: str | Path) -> Path | None:
+        """
+        Move a tree out of the way and queue it for deletion.
+
+        After :meth:`close`, the tree is deleted synchronously instead.
+
+        Args:
+            path (str | Path): The tree to delete.
+
+        Returns:
+            Path | None: Where the tree waits for deletion, None if it was deleted
+                synchronously or did not exist.
+        """
+        path = Path(path)
+        if not os.path.lexists(path):
+            return None
+        with self._condition:
+            if self._closed:
+                self._record(delete_files_and_directories_recursively(path))
+                return None
+            target = self._move_to_trash(path)
+            self._pending += 1
+            self._queued.add(target)
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._work, name="DeferredDeleter", daemon=True
+                )
+                self._worker.start()
+            self._queue.put(target)
+        return target
+
+    def _move_to_trash(self, path: Path) -> Path:
+        name = f"{path.name}{_TRASH_SUFFIX}{uuid.uuid4().hex}"
+        if self.trash is not None:
+            self.trash.mkdir(parents=True, exist_ok=True)
+            try:
+                return path.rename(self.trash / name)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        return path.rename(path.with_name(f".{name}"))
+
+    def _work(self):
+        while (path := self._queue.get()) is not None:
+            try:
+                report = delete_files_and_directories_recursively(
+                    path, self.max_workers
+                )
+            except Exception:
+                report = None
+            with self._condition:
+                self._record(report)
+                self._pending -= 1
+                self._queued.discard(path)
+                self._condition.notify_all()
+
+    def _record(self, report: DeletionReport | None):
+        if report is None:
+            self._errors += 1
+        else:
+            self._deleted += 1
+            self._bytes_freed += report.bytes
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """
+        Wait for all pending deletions to finish.
+
+        Args:
+            timeout (float | None): The maximum time to wait in seconds.
+
+        Returns:
+            bool: Whether the queue is empty.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, drain: bool = True):
+        """
+        Stop the worker thread; later submissions are deleted synchronously.
+
+        Args:
+            drain (bool): Whether to wait for the pending deletions first.
+                Otherwise, the worker finishes the tree it is working on and the
+                remaining ones are left in the trash.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+        _open_deleters.discard(self)
+        if worker is not None:
+            if drain:
+                self._queue.put(None)
+                worker.join()
+            else:
+                while True:
+                    try:
+                        path = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if path is not None:
+                        with self._condition:
+                            self._pending -= 1
+                            self._queued.discard(path)
+                            self._condition.notify_all()
+                self._queue.put(None)
+
+    def sweep(self, *directories: str | Path) -> int:
+        """
+        Delete trees left in the trash, e.g. abandoned by :meth:`close` or by an
+        earlier process.
+
+        Trees still queued in this deleter are left to the worker.
+
+        Args:
+            *directories (str | Path): Further directories to look for left over
+                sibling trees in, besides the :attr:`trash`.
+
+        Returns:
+            int: The number of trees deleted.
+        """
+        candidates: list[Path] = []
+        if self.trash is not None:
+            candidates.extend(_iter_trash(self.trash, hidden=False))
+        for directory in directories:
+            candidates.extend(_iter_trash(Path(directory), hidden=True))
+        swept = 0
+        for path in candidates:
+            with self._condition:
+                if path in self._queued:
+                    continue
+            try:
+                report = delete_files_and_directories_recursively(
+                    path, self.max_workers
+                )
+            except Exception:
+                report = None
+            with self._condition:
+                self._record(report)
+            swept += report is not None
+        return swept
+
+    def _at_exit(self):
+        self.close(drain=self.at_exit == "drain")
+
+    @property
+    def stats(self) -> DeferredDeletionStats:
+        """A snapshot of the deletion statistics."""
+        with self._condition:
+            return DeferredDeletionStats(
+                pending=self._pending,
+                deleted=self._deleted,
+                bytes_freed=self._bytes_freed,
+                errors=self._errors,
+            )
+
+
+_open_deleters: weakref.WeakSet[DeferredDeleter] = weakref.WeakSet()
+"""Deleters to close at exit, without keeping them alive until then."""
+
+
+@atexit.register
+def _close_open_deleters():
+    for deleter in list(_open_deleters):
+        deleter._at_exit()
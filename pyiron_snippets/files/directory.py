@@ -0,0 +1,1653 @@
+"""
+Directories to create, fill, compress and delete.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import mmap
+import os
+import shutil
+import stat
+import sys
+import tarfile
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, BinaryIO, cast
+
+from pyiron_snippets.files._util import (
+    _as_bytes,
+    _file_digest,
+    _fsync,
+    _glob_matcher,
+    _MemberReader,
+    _parallel_map,
+    _write_atomically,
+)
+from pyiron_snippets.files.archive import (
+    ArchiveView,
+    VerificationReport,
+    _archive_index_path,
+    _extract_verified,
+    _file_codecs,
+    _find_archive,
+    _format_manifest,
+    _get_archive_codec,
+    _IndexingTarFile,
+    _manifest_name,
+    _MemberWriter,
+    _parse_manifest,
+    _write_archive_index,
+)
+from pyiron_snippets.files.blob_store import BlobStore
+from pyiron_snippets.files.deletion import (
+    DeferredDeleter,
+    DeletionReport,
+    delete_files_and_directories_recursively,
+)
+from pyiron_snippets.files.locks import FileLock, LockStats, _LockStatsRecorder
+from pyiron_snippets.files.packing import _PACK_NAME, PackedFiles
+from pyiron_snippets.files.sync import (
+    CloneReport,
+    SyncReport,
+    _clone_file,
+    _copy_chunk,
+    _scan_relative,
+    _sync_file,
+)
+from pyiron_snippets.files.tree import (
+    _CATEGORIES,
+    DiskUsage,
+    FileRecord,
+    _disk_usage,
+    _iter_entry_categories,
+    _unique_directory_path,
+    categorize_folder_items,
+    iter_folder_items,
+)
+from pyiron_snippets.files.watch import (
+    DirectoryWatcher,
+    WatchEvent,
+    _Inotify,
+    _InotifyDispatcher,
+)
+
+
+class DirectoryObject:
+    """
+    A class to represent a directory object that can be created, deleted,
+    and managed. It can also compress and decompress its contents.
+    It supports unique directory generation and can be protected from deletion
+    on garbage collection.
+
+    Attributes:
+        deferred_deleter (DeferredDeleter | None): When set, unprotected directories
+            are handed to it on garbage collection instead of being deleted
+            synchronously. (Default is None.)
+    """
+
+    deferred_deleter: DeferredDeleter | None = None
+    blob_store: BlobStore | None = None
+    pack_threshold: int | None = None
+
+    def __init__(
+        self,
+        directory: str | Path | DirectoryObject = ".",
+        generate_unique_directory: bool | None = None,
+        protected: bool | None = None,
+        shard_levels: int = 0,
+        shard_width: int = 2,
+        blob_store: BlobStore | None = None,
+        pack_threshold: int | None = None,
+    ):
+        """
+        Initialize a DirectoryObject.
+
+        Args:
+            directory (str | Path | DirectoryObject): The directory path or
+                DirectoryObject instance.
+            generate_unique_directory (bool | None): If True, generates a unique
+                directory name, otherwise it still generates a unique name if
+                the directory is "." and this parameter is None.
+            protected (bool | None): If True, prevents deletion of the
+                directory object on garbage collection. If None, it defaults to
+                True if the directory already exists.
+            shard_levels (int): How many levels of shard directories to put
+                unique directories in, e.g. 2 for `ab/cd/data_abcd...`, so that
+                no single directory gets too many entries. The shards are taken
+                from the start of the unique name. (Default is 0, put the unique
+                directory directly in `directory`.)
+            shard_width (int): The number of hex digits per shard level, i.e. a
+                fan-out of `16**shard_width`. (Default is 2.)
+            blob_store (BlobStore | None): A store to deduplicate written files
+                into, see :meth:`write` and :meth:`ingest`. Subdirectories share
+                it. (Default is None, write files normally.)
+            pack_threshold (int | None): Files smaller than this many bytes are
+                packed into a single data file instead of being written as files
+                of their own, see :meth:`write` and :meth:`pack`. Subdirectories
+                share it. (Default is None, don't pack.)
+        """
+        if isinstance(directory, str):
+            path = Path(directory)
+        elif isinstance(directory, Path):
+            path = directory
+        elif isinstance(directory, DirectoryObject):
+            path = directory.path
+        if (
+            directory == "." and generate_unique_directory is None
+        ) or generate_unique_directory:
+            path = _unique_directory_path(path, shard_levels, shard_width)
+        if protected is None:
+            protected = path.exists()
+        self._setup(path, protected, blob_store, pack_threshold)
+        self.create()
+
+    def _setup(
+        self,
+        path: Path,
+        protected: bool,
+        blob_store: BlobStore | None,
+        pack_threshold: int | None,
+    ):
+        self._protected = protected
+        self.path: Path = path
+        self.blob_store = blob_store
+        self.pack_threshold = pack_threshold
+        self.packed_files = PackedFiles(self.path / _PACK_NAME)
+        self._lock_stats = _LockStatsRecorder()
+
+    def __getstate__(self):
+        self._protected = True
+        return self.path.__getstate__()
+
+    def __del__(self):
+        if not self._protected:
+            if self.deferred_deleter is None:
+                self.delete(only_if_empty=False)
+            else:
+                self.deferred_deleter.submit(self._locks_dir())
+                self.deferred_deleter.submit(self.path)
+
+    @classmethod
+    def create_unique(
+        cls,
+        n: int,
+        directory: str | Path | DirectoryObject = ".",
+        protected: bool = False,
+        shard_levels: int = 0,
+        shard_width: int = 2,
+    ) -> list[DirectoryObject]:
+        """
+        Create many unique directories at once.
+
+        Every shard directory is created only once, the unique directories in
+        it with a single `mkdir` each.
+
+        Args:
+            n (int): How many directories to create.
+            directory (str | Path | DirectoryObject): Where to create them.
+            protected (bool): Whether to protect them from deletion on garbage
+                collection. (Default is False.)
+            shard_levels (int): Levels of shard directories, see the constructor.
+            shard_width (int): Hex digits per shard level, see the constructor.
+
+        Returns:
+            list[DirectoryObject]: The new directories.
+        """
+        parent = (
+            directory.path
+            if isinstance(directory, DirectoryObject)
+            else Path(directory)
+        )
+        paths = [
+            _unique_directory_path(parent, shard_levels, shard_width) for _ in range(n)
+        ]
+        for shard in sorted({path.parent for path in paths}):
+            shard.mkdir(parents=True, exist_ok=True)
+        directories = []
+        for path in paths:
+            path.mkdir()
+            created = cls.__new__(cls)  # Skip the constructor's `create`
+            created._setup(path, protected, None, None)
+            directories.append(created)
+        return directories
+
+    def create(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def delete(
+        self, only_if_empty: bool = False, max_workers: int | None = 1
+    ) -> DeletionReport:
+        """
+        Remove the directory and everything in it, and the lock files of
+        :meth:`lock`.
+
+        Args:
+            only_if_empty (bool): Only delete the directory if it has no content.
+            max_workers (int | None): The number of threads to delete with, see
+                :func:`delete_files_and_directories_recursively`. Multi-GB trees on
+                network filesystems profit a lot from several workers. (Default is
+                1, delete serially.)
+
+        Returns:
+            DeletionReport: What was removed.
+        """
+        if self.is_empty() or not only_if_empty:
+            delete_files_and_directories_recursively(self._locks_dir())
+            return delete_files_and_directories_recursively(self.path, max_workers)
+        return DeletionReport()
+
+    def disk_usage(
+        self,
+        n_largest: int = 10,
+        max_workers: int | None = 1,
+        cache: dict | None = None,
+    ) -> DiskUsage:
+        """
+        Add up the files in the directory tree.
+
+        Symlinks are not followed, and hardlinked files are counted at each of
+        their paths.
+
+        Args:
+            n_largest (int): How many of the largest files to report. (Default is
+                10.)
+            max_workers (int | None): The number of threads scanning the
+                folders of the tree in parallel. (Default is 1, walk serially; None
+                lets :class:`concurrent.futures.ThreadPoolExecutor` choose.)
+            cache (dict | None): A dictionary to keep between calls (and share
+                between directories), in which the result for each folder is
+                stored with the folder's mtime. Folders whose mtime did not change
+                are not scanned again. As the mtime only changes when entries
+                are added, removed or renamed, files changing size in place are
+                missed. (Default is None, scan everything.)
+
+        Returns:
+            DiskUsage: The apparent and allocated bytes, the number of files and
+                the largest files.
+        """
+        return _disk_usage(str(self.path), n_largest, cache, max_workers)
+
+    def list_content(self) -> dict[str, list[str]]:
+        if not self.packed_files.index_path.exists():
+            return categorize_folder_items(self.path)
+        content: dict[str, list[str]] = {t: [] for t in _CATEGORIES}
+        for category, path in self.iter_content():
+            content[category].append(path)
+        return content
+
+    def iter_content(self) -> Iterator[tuple[str, str]]:
+        """
+        Lazily yield the `(category, path)` pairs of :meth:`list_content`, so
+        callers can stop as soon as they have found what they were looking for.
+
+        Packed files are listed as files, the pack itself is not listed.
+        """
+        if not self.packed_files.index_path.exists():
+            yield from iter_folder_items(self.path)
+            return
+        for category, path in iter_folder_items(self.path):
+            if os.path.basename(path) not in self.packed_files.file_names:
+                yield category, path
+        base = "" if str(self.path) == "." else str(self.path)
+        for name in self.packed_files.names():
+            yield "file", os.path.join(base, name)
+
+    def __len__(self):
+        if not self.path.is_dir():
+            return 0
+        if not self.packed_files.index_path.exists():
+            return sum(1 for _ in _iter_entry_categories(self.path))
+        return len(self.packed_files) + sum(
+            1
+            for _, entry in _iter_entry_categories(self.path)
+            if entry.name not in self.packed_files.file_names
+        )
+
+    def __repr__(self):
+        return f"DirectoryObject(directory='{self.path}')\n{self.list_content()}"
+
+    def get_path(self, file_name):
+        return self.path / file_name
+
+    def file_exists(self, file_name):
+        return self.get_path(file_name).is_file() or (
+            Path(file_name).as_posix() in self.packed_files
+        )
+
+    def open(
+        self, file_name: str | Path, mode: str = "r", encoding: str | None = None
+    ) -> IO:
+        """
+        Open a file for reading, whether it is a file of its own, compressed or
+        packed.
+
+        If there is no file `file_name`, a compressed version of it (e.g.
+        `file_name.gz`, see :meth:`compress_file`) is looked for, and decompressed
+        while it is read.
+
+        Args:
+            file_name (str | Path): The file to open.
+            mode (str): "r" for text or "rb" for bytes. (Default is "r".)
+            encoding (str | None): The text encoding. (Default is None, the
+                locale's.)
+
+        Returns:
+            IO: The open file.
+
+        Raises:
+            FileNotFoundError: If the file exists in none of these forms.
+        """
+        if mode not in ("r", "rb"):
+            raise ValueError(f"Files can only be opened for reading, not {mode!r}")
+        path = self.get_path(file_name)
+        try:
+            f: IO = path.open("rb")
+        except FileNotFoundError:
+            for suffix, codec in _file_codecs():
+                try:
+                    raw = path.with_name(path.name + suffix).open("rb")
+                except FileNotFoundError:
+                    continue
+                decompressor = cast(Callable[[BinaryIO], BinaryIO], codec.decompressor)
+                f = io.BufferedReader(
+                    _MemberReader(decompressor(raw), raw, sys.maxsize)
+                )
+                break
+            else:
+                name = Path(file_name).as_posix()
+                if name not in self.packed_files:
+                    suffixes = [suffix for suffix, _ in _file_codecs()]
+                    raise FileNotFoundError(
+                        f"There is no file {path}, neither plain nor compressed "
+                        f"(with suffix {', '.join(suffixes)}) nor packed"
+                    ) from None
+                f = self.packed_files.open(name)
+        return f if mode == "rb" else io.TextIOWrapper(f, encoding=encoding)
+
+    def compress_file(
+        self, file_name: str | Path, codec: str = "gzip", level: int | None = None
+    ) -> Path:
+        """
+        Compress a single file in place, e.g. `out.dat` to `out.dat.gz`.
+
+        The file is streamed through the compressor in chunks, so memory stays
+        bounded however large it is, and the compressed file only replaces it
+        once complete. :meth:`open` still finds it under its old name.
+
+        Args:
+            file_name (str | Path): The file to compress.
+            codec (str): The name of an :data:`ARCHIVE_CODECS` entry with a
+                compressor, e.g. "gzip", "bz2", "xz" or "zstd" (when the standard
+                library provides it). (Default is "gzip".)
+            level (int | None): The compression level. (Default is None, the
+                codec's default.)
+
+        Returns:
+            Path: The compressed file.
+        """
+        archive_codec = _get_archive_codec(codec)
+        if archive_codec.compressor is None:
+            raise ValueError(f"Codec {codec!r} does not compress")
+        path = self.get_path(file_name)
+        target = path.with_name(path.name + archive_codec.suffix.removeprefix(".tar"))
+        tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with (
+                path.open("rb") as source,
+                tmp_path.open("wb") as raw,
+                archive_codec.compressor(cast(BinaryIO, raw), level) as stream,
+            ):
+                shutil.copyfileobj(source, stream, 2**20)
+            shutil.copystat(path, tmp_path)
+            os.replace(tmp_path, target)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        path.unlink()
+        return target
+
+    def write(self, file_name, content, mode="w"):
+        """
+        Write content to a file.
+
+        With a :attr:`pack_threshold`, files written from scratch (mode "w" or
+        "wb") directly into the directory with less content are packed, and packed
+        files to be appended to are unpacked first. Files in subdirectories are
+        left to the packs of these.
+
+        With a :attr:`blob_store`, files written from scratch are stored there and
+        linked to, while files to be appended to are first turned back into
+        private, writable copies. Materialized files are read-only hard links to
+        the shared blob: code writing files in place, instead of through this
+        method, must not touch them, but replace them.
+        """
+        path = self.get_path(file_name)
+        name = Path(file_name).as_posix()
+        if mode in ("w", "wb") and self._packs(name, content):
+            self.packed_files.put(name, _as_bytes(content))
+            path.unlink(missing_ok=True)
+            return
+        if name in self.packed_files:
+            if mode in ("w", "wb"):
+                self.packed_files.remove(name)
+            else:
+                self.unpack([name])
+        if self.blob_store is not None:
+            if mode in ("w", "wb"):
+                self.blob_store.materialize(
+                    self.blob_store.put_bytes(_as_bytes(content)), path
+                )
+                return
+            if path.exists():
+                stat_result = path.stat()
+                if stat_result.st_nlink > 1:
+                    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+                    shutil.copyfile(path, tmp_path)
+                    os.replace(tmp_path, path)
+                elif not stat_result.st_mode & stat.S_IWUSR:
+                    # A blob copied elsewhere and back, e.g. by compress()
+                    path.chmod(stat.S_IMODE(stat_result.st_mode) | stat.S_IWUSR)
+        with path.open(mode=mode) as f:
+            f.write(content)
+
+    def _packs(self, name: str, content: str | bytes) -> bool:
+        """Whether a file written with this content is packed."""
+        return (
+            self.pack_threshold is not None
+            and "/" not in name
+            and len(_as_bytes(content)) < self.pack_threshold
+        )
+
+    def write_many(
+        self,
+        contents: Mapping[str | Path, str | bytes],
+        max_workers: int | None = None,
+        atomic: bool = False,
+        fsync: bool = False,
+    ):
+        """
+        Write many files concurrently.
+
+        Writing is latency-bound on shared filesystems, so the files are written
+        in parallel on a thread pool.
+
+        Args:
+            contents (Mapping[str | Path, str | bytes]): The content of each file,
+                text or binary.
+            max_workers (int | None): The number of threads. (Default is None,
+                let :class:`concurrent.futures.ThreadPoolExecutor` decide.)
+            atomic (bool): Write each file to a temporary file first and rename
+                it into place, so readers never see partial content. Files
+                materialized from a :attr:`blob_store` always are. (Default is
+                False.)
+            fsync (bool): Make sure the files are on disk before returning. The
+                files (or their blobs) are synced in parallel, and each directory
+                once after all renames. (Default is False.)
+        """
+        names = {Path(name).as_posix(): content for name, content in contents.items()}
+        packed = {
+            name: content
+            for name, content in names.items()
+            if self._packs(name, content)
+        }
+        for name, content in packed.items():
+            self.packed_files.put(name, _as_bytes(content), fsync)
+            self.get_path(name).unlink(missing_ok=True)
+        unpacked = {
+            name: content for name, content in names.items() if name not in packed
+        }
+        previously_packed = [name for name in unpacked if name in self.packed_files]
+        paths = {self.get_path(name): content for name, content in unpacked.items()}
+        if self.blob_store is not None:
+            store = self.blob_store
+            _parallel_map(
+                lambda item: store.materialize(
+                    store.put_bytes(_as_bytes(item[1]), fsync), item[0], fsync
+                ),
+                paths.items(),
+                max_workers,
+            )
+        else:
+            self._write_files(paths, max_workers, atomic, fsync)
+        for name in previously_packed:
+            self.packed_files.remove(name)
+        if fsync and os.name == "posix":
+            folders = {path.parent for path in paths}
+            if packed:
+                folders.add(self.path)
+            for folder in folders:
+                _fsync(folder)
+
+    @staticmethod
+    def _write_files(
+        paths: dict[Path, str | bytes],
+        max_workers: int | None,
+        atomic: bool,
+        fsync: bool,
+    ):
+        tmp_paths = {
+            path: (
+                path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+                if atomic
+                else path
+            )
+            for path in paths
+        }
+
+        def write(path: Path):
+            content = paths[path]
+            mode = "w" if isinstance(content, str) else "wb"
+            with tmp_paths[path].open(mode) as f:
+                f.write(content)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        try:
+            _parallel_map(write, paths, max_workers)
+            if atomic:
+                for path, tmp_path in tmp_paths.items():
+                    os.replace(tmp_path, path)
+        except BaseException:
+            if atomic:
+                for tmp_path in tmp_paths.values():
+                    tmp_path.unlink(missing_ok=True)
+            raise
+
+    def read_many(
+        self,
+        file_names: Iterable[str | Path],
+        binary: bool = False,
+        max_workers: int | None = None,
+    ) -> dict[str | Path, str | bytes]:
+        """
+        Read many files concurrently.
+
+        Args:
+            file_names (Iterable[str | Path]): The files to read.
+            binary (bool): Whether to read bytes instead of text. (Default is
+                False.)
+            max_workers (int | None): The number of threads. (Default is None,
+                let :class:`concurrent.futures.ThreadPoolExecutor` decide.)
+
+        Returns:
+            dict[str | Path, str | bytes]: The content of each file.
+        """
+        file_names = list(file_names)
+
+        def read(file_name: str | Path) -> str | bytes:
+            with self.open(file_name, "rb" if binary else "r") as f:
+                return f.read()
+
+        return dict(
+            zip(file_names, _parallel_map(read, file_names, max_workers), strict=True)
+        )
+
+    def map(self, file_name: str | Path) -> mmap.mmap:
+        """
+        Map a file into memory, read-only.
+
+        The content is paged in by the operating system as it is accessed,
+        without being copied into Python objects; `memoryview(mapped)` gives
+        zero-copy slices. The map is a context manager closing it.
+
+        Args:
+            file_name (str | Path): The file to map.
+
+        Returns:
+            mmap.mmap: The mapped file.
+
+        Raises:
+            ValueError: If the file is empty, which can't be mapped.
+        """
+        with self.get_path(file_name).open("rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def iter_lines(
+        self,
+        file_name: str | Path,
+        separator: bytes = b"\n",
+        start: int = 0,
+        end: int | None = None,
+    ) -> Iterator[bytes]:
+        """
+        Iterate over the lines (or other records) of a memory-mapped file.
+
+        Only one record at a time is copied out of the map, so even huge files
+        are parsed with a small memory footprint.
+
+        Args:
+            file_name (str | Path): The file to read.
+            separator (bytes): What separates the records. (Default is b"\\n".)
+            start (int): The byte offset to start at. (Default is 0.)
+            end (int | None): The byte offset to stop at. (Default is None, the
+                end of the file.)
+
+        Yields:
+            bytes: The records, without separators.
+        """
+        if self.get_path(file_name).stat().st_size == 0:
+            return
+        with self.map(file_name) as mapped:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            end = len(mapped) if end is None else min(end, len(mapped))
+            position = start
+            while position < end:
+                stop = mapped.find(separator, position, end)
+                if stop == -1:
+                    stop = end
+                yield mapped[position:stop]
+                position = stop + len(separator)
+
+    def iter_files(
+        self,
+        pattern: str | Iterable[str] | None = None,
+        min_size: int = 0,
+        newer_than: float | datetime.timedelta | None = None,
+        recursive: bool = True,
+        exclude: str | Iterable[str] | None = None,
+    ) -> Iterator[FileRecord]:
+        """
+        Lazily query the files in the directory.
+
+        The tree is walked with scandir. Names are matched before anything is
+        stat-ed, the stat data scandir caches is reused for the size and time
+        filters, and excluded subdirectories are not entered at all.
+
+        Args:
+            pattern (str | Iterable[str] | None): Glob pattern(s) the files must
+                match, e.g. "*.h5". Patterns containing a "/" are matched against
+                the path relative to this directory. (Default is None, all
+                files.)
+            min_size (int): The minimum size in bytes. (Default is 0.)
+            newer_than (float | datetime.timedelta | None): Only files modified
+                after this timestamp, or within this time span until now.
+                (Default is None, any time.)
+            recursive (bool): Whether to descend into subdirectories. (Default
+                is True.)
+            exclude (str | Iterable[str] | None): Glob pattern(s) of files and
+                directories to skip, e.g. "__pycache__". (Default is None.)
+
+        Yields:
+            FileRecord: The path, size and modification time of each file found.
+        """
+        if isinstance(newer_than, datetime.timedelta):
+            newer_than = time.time() - newer_than.total_seconds()
+        is_excluded = _glob_matcher(exclude)
+        is_included = None if pattern is None else _glob_matcher(pattern)
+        folders = [(str(self.path), "")]
+        while folders:
+            folder, prefix = folders.pop()
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    relative_path = prefix + entry.name
+                    if is_excluded(relative_path):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            folders.append((entry.path, relative_path + "/"))
+                        continue
+                    if is_included is not None and not is_included(relative_path):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat_result = entry.stat()
+                    except FileNotFoundError:  # Removed while walking
+                        continue
+                    if stat_result.st_size < min_size or (
+                        newer_than is not None and stat_result.st_mtime <= newer_than
+                    ):
+                        continue
+                    yield FileRecord(
+                        entry.path, stat_result.st_size, stat_result.st_mtime
+                    )
+
+    def tail(self, file_name: str | Path, n: int = 10) -> list[str]:
+        """
+        The last lines of a file, reading only as much of its end as needed.
+
+        Args:
+            file_name (str | Path): The file to read.
+            n (int): The number of lines. (Default is 10.)
+
+        Returns:
+            list[str]: The lines, without line breaks.
+        """
+        if n <= 0:
+            return []
+        with self.get_path(file_name).open("rb") as f:
+            position = f.seek(0, os.SEEK_END)
+            data = b""
+            while position > 0 and data.count(b"\n") <= n:
+                step = min(2**16, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        return [line.decode(errors="replace") for line in data.splitlines()[-n:]]
+
+    def follow(
+        self,
+        file_name: str | Path,
+        interval: float = 1.0,
+        from_end: bool = True,
+        timeout: float | None = None,
+        inotify: bool | None = None,
+    ) -> Iterator[str]:
+        """
+        Yield the lines appended to a (growing) file, like `tail -f`.
+
+        Only the newly appended bytes are read on each check. If the file is
+        truncated, it is followed from its new start; if it is replaced (e.g.
+        rotated), the rest of the old file is read before switching to the new
+        one. Lines are only yielded once they are complete -- or once the file
+        they are the last line of was replaced.
+
+        Args:
+            file_name (str | Path): The file to follow. It need not exist yet.
+            interval (float): Seconds between checks for new data. With inotify,
+                changes are noticed right away and this is just a fallback for
+                filesystems not reporting them (e.g. network filesystems).
+                (Default is 1.)
+            from_end (bool): Start at the current end of the file instead of its
+                beginning. (Default is True.)
+            timeout (float | None): Stop after this many seconds without new
+                data. (Default is None, follow forever.)
+            inotify (bool | None): Whether to wait for changes with inotify,
+                which is only available on Linux. All followers share a single
+                inotify instance, and fall back to polling if the inotify limits
+                are exhausted anyhow. (Default is None, use it where available.)
+
+        Yields:
+            str: The appended lines, without line breaks.
+        """
+        path = self.get_path(file_name)
+        dispatcher = None
+        changed = None
+        if inotify or (inotify is None and _Inotify.is_available()):
+            dispatcher = _InotifyDispatcher.get()
+            if dispatcher is not None:
+                try:
+                    changed = dispatcher.subscribe(path)
+                except OSError:  # E.g. out of inotify watches, poll instead
+                    dispatcher = None
+        f = None
+        inode = None
+        buffer = b""
+        last_data = time.monotonic()
+        try:
+            while True:
+                if f is None:
+                    with contextlib.suppress(FileNotFoundError):
+                        f = path.open("rb")
+                        inode = os.fstat(f.fileno()).st_ino
+                        if from_end:
+                            f.seek(0, os.SEEK_END)
+                    from_end = False  # Files appearing later are read in full
+                if f is not None:
+                    if os.fstat(f.fileno()).st_size < f.tell():  # Truncated
+                        f.seek(0)
+                        buffer = b""
+                    while data := f.read(2**20):
+                        buffer += data
+                        last_data = time.monotonic()
+                        *lines, buffer = buffer.split(b"\n")
+                        for line in lines:
+                            yield line.decode(errors="replace")
+                    try:
+                        replaced = os.stat(path).st_ino != inode
+                    except FileNotFoundError:
+                        replaced = True
+                    if replaced:
+                        if buffer:  # The unterminated last line of the old file
+                            yield buffer.decode(errors="replace")
+                        f.close()
+                        f, buffer = None, b""
+                        continue
+                if timeout is not None and time.monotonic() - last_data > timeout:
+                    return
+                if changed is None:
+                    time.sleep(interval)
+                else:
+                    changed.wait(interval)
+                    changed.clear()
+        finally:
+            if f is not None:
+                f.close()
+            if dispatcher is not None and changed is not None:
+                dispatcher.unsubscribe(path, changed)
+
+    def ingest(
+        self,
+        exclude: str | Iterable[str] | None = None,
+        include: str | Iterable[str] | None = None,
+    ) -> dict[str, str]:
+        """
+        Deduplicate the existing files of the directory into the :attr:`blob_store`.
+
+        Args:
+            exclude (str | Iterable[str] | None): Glob patterns of files to leave
+                alone, see :meth:`compress`.
+            include (str | Iterable[str] | None): Glob patterns of the files to
+                consider, see :meth:`compress`.
+
+        Returns:
+            dict[str, str]: The content digest for each relative file path.
+        """
+        if self.blob_store is None:
+            raise ValueError(f"{self.path} has no blob store to ingest into")
+        return {
+            arcname: self.blob_store.put_file(entry.path)
+            for entry, arcname in self._files_to_compress(None, exclude, include)
+        }
+
+    def create_subdirectory(self, path):
+        return DirectoryObject(
+            self.path / path,
+            blob_store=self.blob_store,
+            pack_threshold=self.pack_threshold,
+        )
+
+    def clone(
+        self,
+        target: str | Path | DirectoryObject,
+        protected: bool | None = None,
+        max_workers: int | None = None,
+        chunk_size: int = 2**26,
+    ) -> tuple[DirectoryObject, CloneReport]:
+        """
+        Copy the directory as cheaply as the filesystem allows.
+
+        Each file is cloned as a reflink (sharing its data on disk until either
+        copy is modified) where the filesystem supports it, otherwise read-only
+        files are hard linked and all others copied. Files are handled in
+        parallel on a thread pool, and large files are copied in chunks
+        concurrently. Symlinks are recreated as they are, while special files
+        like FIFOs and sockets are skipped.
+
+        Args:
+            target (str | Path | DirectoryObject): Where to put the copy, which
+                must not exist yet.
+            protected (bool | None): Whether to protect the new directory from
+                deletion on garbage collection. (Default is None, don't.)
+            max_workers (int | None): The number of threads. (Default is None,
+                let :class:`concurrent.futures.ThreadPoolExecutor` decide.)
+            chunk_size (int): Files larger than this many bytes are copied in
+                chunks of this size. (Default is 64 MiB.)
+
+        Returns:
+            tuple[DirectoryObject, CloneReport]: The new directory and how its
+                files were made.
+        """
+        target_path = (
+            target.path if isinstance(target, DirectoryObject) else Path(target)
+        )
+        if target_path.exists():
+            raise FileExistsError(f"Can't clone into existing {target_path}")
+        clone = DirectoryObject(
+            target_path,
+            generate_unique_directory=False,
+            protected=protected,
+            blob_store=self.blob_store,
+        )
+        files = []
+        n_skipped = 0
+        folders = [(str(self.path), target_path)]
+        while folders:
+            source, destination = folders.pop()
+            with os.scandir(source) as entries:
+                for entry in entries:
+                    if entry.is_symlink():
+                        os.symlink(os.readlink(entry.path), destination / entry.name)
+                    elif entry.is_dir():
+                        (destination / entry.name).mkdir()
+                        folders.append((entry.path, destination / entry.name))
+                    elif entry.is_file():
+                        files.append(
+                            (entry.path, destination / entry.name, entry.stat())
+                        )
+                    else:
+                        n_skipped += 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            strategies = [
+                future.result()
+                for future in [
+                    executor.submit(_clone_file, *file, chunk_size) for file in files
+                ]
+            ]
+            chunks = [
+                (source, destination, offset, min(chunk_size, st.st_size - offset))
+                for (source, destination, st), strategy in zip(
+                    files, strategies, strict=True
+                )
+                if strategy == "chunked"
+                for offset in range(0, st.st_size, chunk_size)
+            ]
+            for future in [executor.submit(_copy_chunk, *chunk) for chunk in chunks]:
+                future.result()
+        for (source, destination, _), strategy in zip(files, strategies, strict=True):
+            if strategy == "chunked":
+                shutil.copystat(source, destination)
+        return clone, CloneReport(
+            reflinks=strategies.count("reflink"),
+            hardlinks=strategies.count("hardlink"),
+            copies=len(strategies)
+            - strategies.count("reflink")
+            - strategies.count("hardlink"),
+            bytes_copied=sum(
+                st.st_size
+                for (_, _, st), strategy in zip(files, strategies, strict=True)
+                if strategy in ("copy", "chunked")
+            ),
+            skipped=n_skipped,
+        )
+
+    def is_empty(self) -> bool:
+        """
+        Whether the directory has no content, stopping at the first entry.
+
+        A pack without packed files counts as no content.
+        """
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.name not in self.packed_files.file_names:
+                        return False
+        except (FileNotFoundError, NotADirectoryError):
+            return True
+        return len(self.packed_files) == 0
+
+    def sync_to(
+        self,
+        other: str | Path | DirectoryObject,
+        checksum: bool = False,
+        block_size: int | None = 2**20,
+        max_workers: int | None = None,
+        dry_run: bool = False,
+        delete: bool = False,
+    ) -> SyncReport:
+        """
+        Incrementally mirror the directory tree into another directory, like
+        `rsync -a`.
+
+        Files are considered in sync if their size and modification time (in
+        whole seconds) match. Changed files are compared block by block, and only
+        the differing blocks are written: into a reflinked copy which then
+        replaces the file, where the filesystem supports reflinks, and otherwise
+        into the file itself. Files with several hard links (e.g. to a
+        :class:`BlobStore`) and read-only files are not changed in place, but
+        copied in full instead, just like new files: to a temporary file first,
+        which is then moved into place. Files are synced in
+        parallel on a thread pool, and symlinks are recreated as they are.
+
+        Args:
+            other (str | Path | DirectoryObject): The directory to sync to. It is
+                created if necessary.
+            checksum (bool): Also compare the content of files whose size and
+                modification time match. (Default is False.)
+            block_size (int | None): The size of the blocks in which changed
+                files are compared and updated. (Default is 1 MiB; None copies
+                changed files in full.)
+            max_workers (int | None): The number of threads. (Default is None,
+                let :class:`concurrent.futures.ThreadPoolExecutor` decide.)
+            dry_run (bool): Only report what would be transferred, without
+                changing anything. (Default is False.)
+            delete (bool): Remove files and folders from the other directory
+                which are not in this one. (Default is False.)
+
+        Returns:
+            SyncReport: What was (or would be) transferred.
+        """
+        target = other.path if isinstance(other, DirectoryObject) else Path(other)
+        files, folders, links = _scan_relative(self.path)
+        target_files, target_folders, target_links = _scan_relative(target)
+
+        deleted: list[str] = []
+        if delete:
+            for name in sorted(target_folders - folders):
+                if not any(name.startswith(d + "/") for d in deleted):
+                    deleted.append(name)
+            deleted.extend(
+                name
+                for name in sorted(set(target_files) | set(target_links))
+                if name not in files
+                and name not in links
+                and not any(name.startswith(d + "/") for d in deleted)
+            )
+        in_the_way = sorted(
+            {name for name in target_folders if name in files or name in links}
+            | {name for name in target_files if name in folders or name in links}
+            | {name for name in target_links if name in folders or name in files}
+        )
+        if not dry_run:
+            target.mkdir(parents=True, exist_ok=True)
+            for name in deleted + in_the_way:
+                delete_files_and_directories_recursively(target / name)
+            for name in sorted(folders - target_folders):
+                (target / name).mkdir(exist_ok=True)
+        for name in in_the_way:
+            target_files.pop(name, None)
+            target_links.pop(name, None)
+
+        copied = []
+        for name, link in sorted(links.items()):
+            if target_links.get(name) != link:
+                copied.append(name)
+                if not dry_run:
+                    (target / name).unlink(missing_ok=True)
+                    os.symlink(link, target / name)
+
+        names = sorted(files)
+        results = _parallel_map(
+            lambda name: _sync_file(
+                self.path / name,
+                target / name,
+                files[name],
+                target_files.get(name),
+                checksum,
+                block_size,
+                dry_run,
+            ),
+            names,
+            max_workers,
+        )
+        copied.extend(
+            name
+            for name, (done, _) in zip(names, results, strict=True)
+            if done == "copied"
+        )
+        return SyncReport(
+            copied=tuple(copied),
+            updated=tuple(
+                name
+                for name, (done, _) in zip(names, results, strict=True)
+                if done == "updated"
+            ),
+            deleted=tuple(deleted),
+            unchanged=sum(done == "unchanged" for done, _ in results),
+            bytes_transferred=sum(n_bytes for _, n_bytes in results),
+        )
+
+    def checksums(
+        self,
+        algorithm: str = "sha256",
+        max_workers: int | None = None,
+        write_manifest: bool = True,
+    ) -> dict[str, str]:
+        """
+        Hash all files in the directory tree.
+
+        The files are hashed in parallel on a thread pool; :mod:`hashlib` releases
+        the GIL while hashing the chunks read.
+
+        Args:
+            algorithm (str): A :mod:`hashlib` algorithm. (Default is "sha256".)
+            max_workers (int | None): The number of threads. (Default is None,
+                let :class:`concurrent.futures.ThreadPoolExecutor` decide.)
+            write_manifest (bool): Store the hashes in a manifest file,
+                `.<algorithm>sums` (e.g. `.sha256sums`), in the format of
+                `sha256sum` and friends. :meth:`verify` checks against it.
+                (Default is True.)
+
+        Returns:
+            dict[str, str]: The hex digest of each file, by relative posix path.
+        """
+        digests = self._checksums(algorithm, max_workers, None)
+        if write_manifest:
+            _write_atomically(
+                self.get_path(_manifest_name(algorithm)), _format_manifest(digests)
+            )
+        return digests
+
+    def _checksums(
+        self,
+        algorithm: str,
+        max_workers: int | None,
+        files: Iterable[tuple[os.DirEntry[str], str]] | None,
+    ) -> dict[str, str]:
+        if files is None:
+            files = self._files_to_compress(
+                [_manifest_name(a) for a in hashlib.algorithms_available], None, None
+            )
+        paths = {arcname: entry.path for entry, arcname in files}
+        return dict(
+            zip(
+                paths,
+                _parallel_map(
+                    lambda path: _file_digest(path, algorithm),
+                    paths.values(),
+                    max_workers,
+                ),
+                strict=True,
+            )
+        )
+
+    def verify(
+        self, algorithm: str = "sha256", max_workers: int | None = None
+    ) -> VerificationReport:
+        """
+        Re-hash the files in the manifest written by :meth:`checksums`.
+
+        Args:
+            algorithm (str): The algorithm of the manifest. (Default is "sha256".)
+            max_workers (int | None): The number of threads. (Default is None,
+                let :class:`concurrent.futures.ThreadPoolExecutor` decide.)
+
+        Returns:
+            VerificationReport: The files which changed or are missing.
+        """
+        expected = _parse_manifest(self.get_path(_manifest_name(algorithm)).read_text())
+
+        def digest(name: str) -> str | None:
+            try:
+                return _file_digest(self.get_path(name), algorithm)
+            except FileNotFoundError:
+                return None
+
+        names = sorted(expected)
+        digests = _parallel_map(digest, names, max_workers)
+        return VerificationReport(
+            mismatched=tuple(
+                name
+                for name, d in zip(names, digests, strict=True)
+                if d is not None and d != expected[name]
+            ),
+            missing=tuple(
+                name for name, d in zip(names, digests, strict=True) if d is None
+            ),
+        )
+
+    def watch(
+        self,
+        timeout: float | None = None,
+        debounce: float = 0.1,
+        interval: float = 1.0,
+        inotify: bool | None = None,
+    ) -> Iterator[WatchEvent]:
+        """
+        Yield the changes to the entries of the directory as they happen, from
+        the first iteration on.
+
+        To watch many directories at once, add them to one
+        :class:`DirectoryWatcher` instead.
+
+        Args:
+            timeout (float | None): Stop after this many seconds without a
+                change. (Default is None, watch forever.)
+            debounce (float): See :class:`DirectoryWatcher`. (Default is 0.1.)
+            interval (float): See :class:`DirectoryWatcher`. (Default is 1.)
+            inotify (bool | None): See :class:`DirectoryWatcher`. (Default is
+                None, use inotify where available.)
+
+        Yields:
+            WatchEvent: The changes.
+        """
+        with DirectoryWatcher(debounce, interval, inotify) as watcher:
+            watcher.add(self)
+            yield from watcher.events(timeout)
+
+    def lock(
+        self,
+        name: str | Path | None = None,
+        shared: bool = False,
+        timeout: float | None = None,
+    ) -> FileLock:
+        """
+        A lock on the whole directory or on a single file in it, held across
+        processes.
+
+        Locks on different files are independent, so writers to different files
+        never wait for each other. Locks are advisory: they only exclude those
+        who take them, too. The lock files are kept out of the directory's
+        content, in a `<name>.locks` folder next to it: `.lock` for the whole
+        directory and `<file name>.lock` for single files. They are left in place
+        until the directory is deleted.
+
+        Use it as a context manager, raising a :class:`TimeoutError` if the lock
+        can't be acquired in time, or call :meth:`FileLock.acquire` (with a
+        `timeout` of 0 to just try) and :meth:`FileLock.release`.
+
+        Args:
+            name (str | Path | None): The file to lock. (Default is None, lock
+                the whole directory.)
+            shared (bool): Take a shared (read) lock, which only excludes
+                exclusive ones. (Default is False, an exclusive lock.)
+            timeout (float | None): How long to wait for the lock in the context
+                manager. (Default is None, wait as long as it takes.)
+
+        Returns:
+            FileLock: The (not yet acquired) lock. The time waiting for it is
+                added up in :attr:`lock_stats`.
+        """
+        if name is None:
+            path = self._locks_dir() / ".lock"
+        else:
+            path = self._locks_dir() / f"{Path(name).as_posix()}.lock"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return FileLock(path, shared, timeout, self._lock_stats.record)
+
+    def _locks_dir(self) -> Path:
+        path = self.path.resolve()
+        return path.with_name(f"{path.name}.locks")
+
+    @property
+    def lock_stats(self) -> LockStats:
+        """How long acquiring the locks of :meth:`lock` took so far."""
+        return self._lock_stats.stats
+
+    def remove_files(self, *files: str):
+        for file in files:
+            path = self.get_path(file)
+            if path.is_file():
+                path.unlink()
+            else:
+                self.packed_files.remove(Path(file).as_posix())
+                if len(self.packed_files) == 0:
+                    self.packed_files.clear()
+
+    def pack(self, threshold: int | None = None) -> int:
+        """
+        Pack the small files directly in the directory, e.g. after a code wrote
+        them, to free their inodes.
+
+        Args:
+            threshold (int | None): Files smaller than this many bytes are packed.
+                (Default is None, use :attr:`pack_threshold`.)
+
+        Returns:
+            int: The number of files packed.
+        """
+        threshold = self.pack_threshold if threshold is None else threshold
+        if threshold is None:
+            raise ValueError("No threshold to pack files below")
+        n_packed = 0
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if (
+                    entry.name not in self.packed_files.file_names
+                    and entry.is_file(follow_symlinks=False)
+                    and entry.stat(follow_symlinks=False).st_size < threshold
+                ):
+                    with open(entry.path, "rb") as f:
+                        self.packed_files.put(entry.name, f.read())
+                    os.unlink(entry.path)
+                    n_packed += 1
+        return n_packed
+
+    def unpack(self, file_names: Iterable[str | Path] | None = None):
+        """
+        Turn packed files back into files of their own, for tools which need
+        real files. Once all files are unpacked, the pack is removed.
+
+        Args:
+            file_names (Iterable[str | Path] | None): What to unpack. (Default is
+                None, everything.)
+        """
+        names = (
+            self.packed_files.names()
+            if file_names is None
+            else [Path(file_name).as_posix() for file_name in file_names]
+        )
+        for name in names:
+            path = self.get_path(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(self.packed_files.read_bytes(name))
+            os.replace(tmp_path, path)
+            self.packed_files.remove(name)
+        if len(self.packed_files) == 0:
+            self.packed_files.clear()
+
+    def compress(
+        self,
+        exclude_files: list[str | Path] | None = None,
+        codec: str = "gzip",
+        level: int | None = None,
+        workers: int = 1,
+        streaming: bool = False,
+        exclude: str | Iterable[str] | None = None,
+        include: str | Iterable[str] | None = None,
+        checksums: str | None = None,
+    ):
+        """
+        Move the files of the directory into a tar archive next to it.
+
+        Nothing happens if an archive (of any codec) already exists -- unless an
+        interrupted streaming compression left its journal behind, in which case
+        that compression is resumed (with its original codec and level).
+
+        Args:
+            exclude_files (list[str | Path] | None): Files to leave in place.
+            codec (str): The compression to use, a key of :data:`ARCHIVE_CODECS`,
+                e.g. "gzip", "bz2", "xz", "zstd" (when the standard library
+                provides it) or "tar" for no compression. (Default is "gzip".)
+            level (int | None): The compression level, the codec's default when
+                None.
+            workers (int): The number of threads to compress with. With more
+                than one, the tar stream is cut into blocks which are compressed
+                concurrently and stored as consecutive members, which standard
+                tools (e.g. `tar xzf`) read like any other archive. (Default is
+                1, compress serially.)
+            streaming (bool): Remove each file as soon as it is safely on disk
+                in the archive, instead of once the archive is complete, so that
+                the peak disk usage barely exceeds the size of the directory.
+                Every file becomes its own compressed member and the progress is
+                journaled, so an interrupted run can be resumed by compressing
+                again or rolled back with :meth:`decompress`. (Default is False.)
+            exclude (str | Iterable[str] | None): Glob patterns of files to leave
+                in place. Patterns containing a "/" are matched against the path
+                relative to the directory, others against the file name only.
+                Matching subdirectories are skipped entirely.
+            include (str | Iterable[str] | None): Glob patterns (matched like
+                `exclude`) restricting the files to archive. By default, all
+                files are archived.
+            checksums (str | None): A :mod:`hashlib` algorithm to hash the files
+                with (in `workers` threads). The manifest (see
+                :meth:`checksums`) is stored as the first member of the archive,
+                and :meth:`decompress` validates the files against it. Not
+                available with `streaming`. (Default is None, store no
+                checksums.)
+        """
+        archive_codec = _get_archive_codec(codec)
+        if streaming and workers > 1:
+            raise ValueError("Streaming compression is serial, use workers=1")
+        if streaming and checksums is not None:
+            raise ValueError("Streaming compression can't embed checksums")
+        files: Iterable[tuple[os.DirEntry[str], str]] = self._files_to_compress(
+            exclude_files, exclude, include
+        )
+        journal_path = self._journal_path()
+        if journal_path.exists():
+            self._compress_streaming(files, journal_path)
+            return
+        if self._find_archive() is not None:
+            return
+        if streaming:
+            with journal_path.open("w") as journal:
+                journal.write(json.dumps({"codec": codec, "level": level}) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            self._compress_streaming(files, journal_path)
+            return
+        output_tar_path = self.path.resolve().with_suffix(archive_codec.suffix)
+        files_to_delete = []
+        with archive_codec.open(output_tar_path, level, workers) as tar:
+            if checksums is not None:
+                manifest_name = _manifest_name(checksums)
+                files = [(e, a) for e, a in files if a != manifest_name]
+                manifest = _format_manifest(
+                    self._checksums(checksums, workers, files)
+                ).encode()
+                info = tarfile.TarInfo(manifest_name)
+                info.size = len(manifest)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(manifest))
+                if (self.path / manifest_name).exists():
+                    files_to_delete.append(str(self.path / manifest_name))
+            for entry, arcname in files:
+                tar.add(entry.path, arcname=arcname)
+                files_to_delete.append(entry.path)
+        for file in files_to_delete:
+            os.unlink(file)
+
+    def _files_to_compress(
+        self,
+        exclude_files: list[str | Path] | None,
+        exclude: str | Iterable[str] | None,
+        include: str | Iterable[str] | None,
+    ) -> Iterator[tuple[os.DirEntry[str], str]]:
+        """
+        Yield the scandir entry and the relative posix path of each file to
+        compress.
+
+        The tree is walked once with scandir, filtering on the relative paths
+        only, so nothing has to be resolved.
+        """
+        directory = self.path.resolve()
+        excluded_paths = set()
+        for f in exclude_files or []:
+            f = Path(f)
+            if f.is_absolute():
+                try:
+                    f = f.resolve().relative_to(directory)
+                except ValueError:  # Can't be in the archive anyhow
+                    continue
+            excluded_paths.add(Path(os.path.normpath(f)).as_posix())
+        is_excluded = _glob_matcher(exclude)
+        is_included = None if include is None else _glob_matcher(include)
+        folders = [(str(directory), "")]
+        while folders:
+            folder, prefix = folders.pop()
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    arcname = prefix + entry.name
+                    if arcname in excluded_paths or is_excluded(arcname):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append((entry.path, arcname + "/"))
+                    elif entry.is_file() and (
+                        is_included is None or is_included(arcname)
+                    ):
+                        yield entry, arcname
+
+    def _journal_path(self) -> Path:
+        return self.path.resolve().with_suffix(".tar.journal")
+
+    @staticmethod
+    def _read_journal(journal_path: Path) -> tuple[dict, list[dict]]:
+        header, *entries = (
+            json.loads(line) for line in journal_path.read_text().splitlines()
+        )
+        return header, entries
+
+    def _compress_streaming(
+        self, files: Iterable[tuple[os.DirEntry[str], str]], journal_path: Path
+    ):
+        header, entries = self._read_journal(journal_path)
+        archive_codec = _get_archive_codec(header["codec"])
+        tar_path = self.path.resolve().with_suffix(archive_codec.suffix)
+        archive_size = entries[-1]["archive_size"] if entries else 0
+        tar_offset = entries[-1]["tar_offset"] if entries else 0
+        archived = {entry["name"] for entry in entries}
+        new_entries = []
+        fd = os.open(tar_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+        with (
+            open(fd, "r+b") as raw,
+            journal_path.open("a") as journal,
+        ):
+            # Drop whatever was written after the last journaled member
+            raw.truncate(archive_size)
+            raw.seek(archive_size)
+            writer = _MemberWriter(
+                cast(BinaryIO, raw),
+                archive_codec.compressor,
+                header["level"],
+                tar_offset,
+            )
+            with writer, _IndexingTarFile.open(fileobj=writer, mode="w") as tar:
+                for file, arcname in files:
+                    if arcname not in archived:
+                        tar.add(file.path, arcname=arcname)
+                        writer.end_member()
+                        os.fsync(raw.fileno())
+                        entry = {
+                            "name": arcname,
+                            "archive_size": raw.tell(),
+                            "tar_offset": tar.offset,
+                            "offset_data": tar.getmembers()[-1].offset_data,
+                            "size": tar.getmembers()[-1].size,
+                        }
+                        new_entries.append(entry)
+                        journal.write(json.dumps(entry) + "\n")
+                        journal.flush()
+                        os.fsync(journal.fileno())
+                    os.unlink(file.path)
+            os.fsync(raw.fileno())
+        entries += new_entries
+        _write_archive_index(
+            tar_path,
+            [(0, 0)] + [(e["tar_offset"], e["archive_size"]) for e in entries],
+            {e["name"]: (e["offset_data"], e["size"]) for e in entries},
+        )
+        journal_path.unlink()
+
+    def decompress(self):
+        """
+        Extract the archive written by :meth:`compress` and remove it.
+
+        The codec is detected automatically. If a streaming compression was
+        interrupted, this rolls it back: the files archived so far are restored
+        and the journal is removed.
+        """
+        journal_path = self._journal_path()
+        if journal_path.exists():
+            header, entries = self._read_journal(journal_path)
+            tar_path = self.path.resolve().with_suffix(
+                _get_archive_codec(header["codec"]).suffix
+            )
+            if tar_path.exists():
+                with open(tar_path, "r+b") as raw:
+                    raw.truncate(entries[-1]["archive_size"] if entries else 0)
+                if not entries:
+                    tar_path.unlink()
+            journal_path.unlink()
+        tar_path = self._find_archive()
+        if tar_path is None:
+            return
+        with tarfile.open(tar_path, "r:*") as tar:
+            _extract_verified(tar, self.path.resolve())
+        tar_path.unlink()
+        _archive_index_path(tar_path).unlink(missing_ok=True)
+
+    def open_archive(self) -> ArchiveView:
+        """
+        Read single files from the archive written by :meth:`compress`, without
+        extracting it.
+
+        Raises:
+            FileNotFoundError: If there is no archive.
+        """
+        tar_path = self._find_archive()
+        if tar_path is None:
+            raise FileNotFoundError(f"There is no archive of {self.path}")
+        return ArchiveView(tar_path)
+
+    def _find_archive(self) -> Path | None:
+        return _find_archive(self.path)
+
+    def snapshot(
+        self,
+        codec: str = "gzip",
+        level: int | None = None,
+        content_hash: bool = False,
+        exclude: str | Iterable[str] | None = None,
+        include: str | Iterable[str] | None = None,
+    ) -> Path:
+        """
+        Archive the files which are new or changed since the last snapshot,
+        leaving the directory untouched.
+
+        Snapshots are stored in a `.snapshots` folder next to the directory. Each
+        consists of an archive and a manifest of all files at that time, with
+        their relative path, size, modification time and, optionally, content
+        hash. Files are considered unchanged if their size and modification time
+        match the previous manifest -- or, with `content_hash`, if at least their
+        content does.
+
+        Args:
+            codec (str): The compression of the archive, see :meth:`compress`.
+            level (int | None): The compression level, see :meth:`compress`.
+            content_hash (bool): Whether to also compare SHA-256 hashes of the
+                files whose size or modification time changed. (Default is
+                False.)
+            exclude (str | Iterable[str] | None): Glob patterns of files to leave
+                out, see :meth:`compress`.
+            include (str | Iterable[str] | None): Glob patterns of files to
+                consider, see :meth:`compress`.
+
+        Returns:
+            Path: The archive of the snapshot.
+        """
+        archive_codec = _get_archive_codec(codec)
+        snapshot_dir = self._snapshot_dir()
+        snapshot_dir.mkdir(exist_ok=True)
+        manifests = self._snapshot_manifests()
+        previous = json.loads(manifests[-1].read_text())["files"] if manifests else {}
+        index = len(manifests)
+        files = {}
+        changed = []
+        for entry, arcname in self._files_to_compress(None, exclude, include):
+            stat_result = entry.stat()
+            record: dict[str, int | str] = {
+                "size": stat_result.st_size,
+                "mtime_ns": stat_result.st_mtime_ns,
+            }
+            old = previous.get(arcname, {})
+            if all(old.get(k) == v for k, v in record.items()):
+                files[arcname] = old
+                continue
+            if content_hash:
+                record["sha256"] = _file_digest(entry.path, "sha256")
+                if old.get("sha256") == record["sha256"]:
+                    files[arcname] = {**record, "snapshot": old["snapshot"]}
+                    continue
+            files[arcname] = {**record, "snapshot": index}
+            changed.append((entry.path, arcname))
+        tar_path = snapshot_dir / f"snapshot_{index:04d}{archive_codec.suffix}"
+        with archive_codec.open(tar_path, level) as tar:
+            for path, arcname in changed:
+                tar.add(path, arcname=arcname)
+        _write_atomically(
+            snapshot_dir / f"snapshot_{index:04d}.json",
+            json.dumps({"archive": tar_path.name, "files": files}),
+        )
+        return tar_path
+
+    def restore_snapshot(self, index: int = -1):
+        """
+        Bring the files back to their state at a snapshot.
+
+        Every file of the snapshot is extracted once, from the snapshot in the
+        chain which last archived it. Files which are not part of the snapshot
+        are left alone.
+
+        Args:
+            index (int): Which snapshot to restore. (Default is -1, the latest.)
+
+        Raises:
+            FileNotFoundError: If there are no snapshots.
+        """
+        manifests = self._snapshot_manifests()
+        if not manifests:
+            raise FileNotFoundError(f"There are no snapshots of {self.path}")
+        files = json.loads(manifests[index].read_text())["files"]
+        names_by_snapshot: dict[int, list[str]] = collections.defaultdict(list)
+        for arcname, record in files.items():
+            names_by_snapshot[record["snapshot"]].append(arcname)
+        for i, names in sorted(names_by_snapshot.items()):
+            archive = (
+                self._snapshot_dir() / json.loads(manifests[i].read_text())["archive"]
+            )
+            with tarfile.open(archive, "r:*") as tar:
+                members = {member.name: member for member in tar}
+                tar.extractall(
+                    path=self.path.resolve(),
+                    members=[members[name] for name in names],
+                    filter="fully_trusted",
+                )
+
+    def _snapshot_dir(self) -> Path:
+        return self.path.resolve().with_suffix(".snapshots")
+
+    def _snapshot_manifests(self) -> list[Path]:
+        return sorted(self._snapshot_dir().glob("snapshot_*.json"))
@@ -0,0 +1,192 @@
+"""
+Advisory file locks, held across processes.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+
+@dataclasses.dataclass(frozen=True)
+class LockStats:
+    """
+    How long acquiring locks took.
+
+    Attributes:
+        acquisitions (int): The number of locks acquired.
+        contended (int): How many of them were held elsewhere at first.
+        total_wait (float): The total time spent waiting, in seconds.
+        max_wait (float): The longest wait, in seconds.
+    """
+
+    acquisitions: int = 0
+    contended: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class _LockStatsRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = LockStats()
+
+    def record(self, wait: float, contended: bool):
+        with self._lock:
+            self._stats = LockStats(
+                acquisitions=self._stats.acquisitions + 1,
+                contended=self._stats.contended + contended,
+                total_wait=self._stats.total_wait + wait,
+                max_wait=max(self._stats.max_wait, wait),
+            )
+
+    @property
+    def stats(self) -> LockStats:
+        with self._lock:
+            return self._stats
+
+
+class _Unset:
+    """The type of :data:`_UNSET`, for arguments where None has a meaning."""
+
+
+_UNSET = _Unset()
+
+
+class FileLock:
+    """
+    An advisory lock on a file, held across processes.
+
+    It is built on `flock`, which is released by the operating system when the
+    holding process dies, so no stale locks are left behind. Each instance opens
+    the lock file on its own, so instances also exclude each other within a
+    process, e.g. in different threads. On Windows, where `flock` does not exist,
+    the first byte of the file is locked instead, and shared locks are
+    exclusive.
+
+    The lock files are created as needed and never removed, since removing them
+    could let two processes lock different files of the same name.
+
+    Args:
+        path (str | Path): The lock file.
+        shared (bool): Take a shared (read) lock, which only excludes exclusive
+            ones. (Default is False, an exclusive lock.)
+        timeout (float | None): How long to wait for the lock, unless
+            :meth:`acquire` is given another timeout. (Default is None, wait as
+            long as it takes.)
+        on_acquired (Callable[[float, bool], None] | None): Called with the time
+            waited and whether the lock was held elsewhere at first, each time
+            the lock is acquired, e.g. to collect metrics.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        shared: bool = False,
+        timeout: float | None = None,
+        on_acquired: Callable[[float, bool], None] | None = None,
+    ):
+        self.path = Path(path)
+        self.shared = shared
+        self.timeout = timeout
+        self.wait_time: float | None = None
+        self.on_acquired = on_acquired
+        self._fd: int | None = None
+
+    @property
+    def locked(self) -> bool:
+        """Whether this instance holds the lock."""
+        return self._fd is not None
+
+    def acquire(self, timeout: float | None | _Unset = _UNSET) -> bool:
+        """
+        Take the lock.
+
+        Args:
+            timeout (float | None): How long to wait, 0 to just try once and None
+                to wait as long as it takes. (Default is the :attr:`timeout` of
+                the lock.)
+
+        Returns:
+            bool: Whether the lock was acquired.
+        """
+        if isinstance(timeout, _Unset):
+            timeout = self.timeout
+        if self._fd is not None:
+            raise RuntimeError(f"{self.path} is already locked by this instance")
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        start = time.monotonic()
+        try:
+            contended = not self._try_lock(fd)
+            if contended:
+                if timeout is None and sys.platform != "win32":
+                    import fcntl
+
+                    fcntl.flock(fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+                elif not self._poll_lock(fd, start, timeout):
+                    os.close(fd)
+                    return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self.wait_time = time.monotonic() - start
+        if self.on_acquired is not None:
+            self.on_acquired(self.wait_time, contended)
+        return True
+
+    def _poll_lock(self, fd: int, start: float, timeout: float | None) -> bool:
+        delay = 0.001
+        while True:
+            remaining = None if timeout is None else start + timeout - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            time.sleep(delay if remaining is None else min(delay, remaining))
+            if self._try_lock(fd):
+                return True
+            delay = min(2 * delay, 0.05)
+
+    def _try_lock(self, fd: int) -> bool:
+        if sys.platform == "win32":
+            import msvcrt
+
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                return False
+        else:
+            import fcntl
+
+            try:
+                fcntl.flock(
+                    fd,
+                    (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | fcntl.LOCK_NB,
+                )
+                return True
+            except BlockingIOError:
+                return False
+
+    def release(self):
+        """Give the lock up."""
+        if self._fd is None:
+            return
+        if sys.platform == "win32":
+            import msvcrt
+
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)  # Releases the flock
+        self._fd = None
+
+    def __enter__(self) -> FileLock:
+        if not self.acquire():
+            raise TimeoutError(f"Could not lock {self.path} within {self.timeout} s")
+        return self
+
+    def __exit__(self, *args):
+        self.release()
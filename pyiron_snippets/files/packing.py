@@ -0,0 +1,150 @@
+"""
+Many small files packed into a single data file.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import threading
+from pathlib import Path
+from typing import BinaryIO, cast
+
+from pyiron_snippets.files._util import _MemberReader
+
+_PACK_NAME = ".packed"
+
+
+class PackedFiles:
+    """
+    Many small files packed into one append-only data file.
+
+    Each file's content is appended to the data file and its name, offset and
+    size to an index file next to it (as one JSON line, `<path>.index`), so the
+    pack only ever costs two inodes. The latest index entry for a name wins;
+    removing a file appends a tombstone. Both files are only ever appended to
+    with `O_APPEND`, so concurrent writers don't clobber each other, and a crash
+    leaves at most unreferenced data behind.
+
+    Args:
+        path (str | Path): The data file.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".index")
+        self._entries: dict[str, tuple[int, int]] = {}
+        self._index_position = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Read index entries appended since the last refresh."""
+        try:
+            with self.index_path.open("rb") as f:
+                if os.fstat(f.fileno()).st_size < self._index_position:  # Rewritten
+                    self._entries.clear()
+                    self._index_position = 0
+                f.seek(self._index_position)
+                data = f.read()
+        except FileNotFoundError:
+            self._entries.clear()
+            self._index_position = 0
+            return
+        complete = data.rfind(b"\n") + 1  # A concurrent writer may be mid-line
+        for line in data[:complete].splitlines():
+            entry = json.loads(line)
+            if entry["offset"] < 0:
+                self._entries.pop(entry["name"], None)
+            else:
+                self._entries[entry["name"]] = (entry["offset"], entry["size"])
+        self._index_position += complete
+
+    @staticmethod
+    def _append(path: Path, data: bytes, fsync: bool = False) -> int:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+            if fsync:
+                os.fsync(fd)
+            return os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+        finally:
+            os.close(fd)
+
+    def _append_entry(self, name: str, offset: int, size: int, fsync: bool = False):
+        self._append(
+            self.index_path,
+            json.dumps({"name": name, "offset": offset, "size": size}).encode() + b"\n",
+            fsync,
+        )
+
+    def names(self) -> list[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return name in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._entries)
+
+    def _locate(self, name: str) -> tuple[int, int]:
+        with self._lock:
+            self._refresh()
+            try:
+                return self._entries[name]
+            except KeyError:
+                raise FileNotFoundError(
+                    f"{name} is not packed in {self.path}"
+                ) from None
+
+    def size(self, name: str) -> int:
+        return self._locate(name)[1]
+
+    def put(self, name: str, data: bytes, fsync: bool = False):
+        """
+        Pack a file, replacing any earlier version.
+
+        Args:
+            name (str): The name of the file.
+            data (bytes): Its content.
+            fsync (bool): Make sure the content is on disk before returning.
+                (Default is False.)
+        """
+        offset = self._append(self.path, data, fsync)
+        self._append_entry(name, offset, len(data), fsync)
+
+    @property
+    def file_names(self) -> set[str]:
+        """The names of the data and index files."""
+        return {self.path.name, self.index_path.name}
+
+    def remove(self, name: str):
+        if name in self:
+            self._append_entry(name, -1, 0)
+
+    def open(self, name: str) -> io.BufferedReader:
+        """Open a packed file for binary reading."""
+        offset, size = self._locate(name)
+        raw = self.path.open("rb", buffering=0)
+        raw.seek(offset)
+        return io.BufferedReader(_MemberReader(cast(BinaryIO, raw), raw, size))
+
+    def read_bytes(self, name: str) -> bytes:
+        offset, size = self._locate(name)
+        with self.path.open("rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def clear(self):
+        """Remove the data and index files."""
+        with self._lock:
+            self.index_path.unlink(missing_ok=True)
+            self.path.unlink(missing_ok=True)
+            self._entries.clear()
+            self._index_position = 0
@@ -0,0 +1,195 @@
+"""
+Cloning and synchronizing directory trees.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import filecmp
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import cast
+
+from pyiron_snippets.files._util import _reflink
+
+
+@dataclasses.dataclass(frozen=True)
+class CloneReport:
+    """How the files of a :meth:`DirectoryObject.clone` were made."""
+
+    reflinks: int = 0
+    hardlinks: int = 0
+    copies: int = 0
+    bytes_copied: int = 0
+    skipped: int = 0
+    """Special files, like FIFOs and sockets, which are not cloned."""
+
+
+def _clone_file(
+    source: str, destination: Path, stat_result: os.stat_result, chunk_size: int
+) -> str:
+    if _reflink(source, destination):
+        shutil.copystat(source, destination)
+        return "reflink"
+    if not stat_result.st_mode & 0o222:
+        try:
+            os.link(source, destination)
+            return "hardlink"
+        except OSError:
+            pass
+    if stat_result.st_size > chunk_size:
+        with open(destination, "wb") as f:
+            f.truncate(stat_result.st_size)
+        return "chunked"
+    shutil.copy2(source, destination)
+    return "copy"
+
+
+def _copy_chunk(source: str, destination: Path, offset: int, length: int):
+    with open(source, "rb") as src, open(destination, "r+b") as dst:
+        if hasattr(os, "copy_file_range"):
+            try:
+                while length > 0:
+                    n_bytes = os.copy_file_range(
+                        src.fileno(), dst.fileno(), length, offset, offset
+                    )
+                    if n_bytes == 0:
+                        return
+                    offset += n_bytes
+                    length -= n_bytes
+                return
+            except OSError:  # E.g. not supported across these filesystems
+                pass
+        src.seek(offset)
+        dst.seek(offset)
+        while length > 0:
+            data = src.read(min(length, 2**20))
+            if not data:
+                return
+            dst.write(data)
+            length -= len(data)
+
+
+@dataclasses.dataclass(frozen=True)
+class SyncReport:
+    """
+    What :meth:`DirectoryObject.sync_to` transferred -- or would have, in a dry
+    run.
+
+    Attributes:
+        copied (tuple[str, ...]): The files and symlinks copied in full.
+        updated (tuple[str, ...]): The files of which only differing blocks were
+            written.
+        deleted (tuple[str, ...]): The extraneous files and folders removed.
+        unchanged (int): The number of files already in sync.
+        bytes_transferred (int): The number of bytes written.
+    """
+
+    copied: tuple[str, ...] = ()
+    updated: tuple[str, ...] = ()
+    deleted: tuple[str, ...] = ()
+    unchanged: int = 0
+    bytes_transferred: int = 0
+
+
+def _scan_relative(
+    root: Path,
+) -> tuple[dict[str, os.stat_result], set[str], dict[str, str]]:
+    """
+    The files (with their stat), folders and symlinks (with their targets) in a
+    tree, by relative posix path.
+    """
+    files: dict[str, os.stat_result] = {}
+    folders: set[str] = set()
+    links: dict[str, str] = {}
+    if not root.is_dir():
+        return files, folders, links
+    stack = [(str(root), "")]
+    while stack:
+        folder, prefix = stack.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                name = prefix + entry.name
+                if entry.is_symlink():
+                    links[name] = os.readlink(entry.path)
+                elif entry.is_dir():
+                    folders.add(name)
+                    stack.append((entry.path, name + "/"))
+                elif entry.is_file():
+                    files[name] = entry.stat()
+    return files, folders, links
+
+
+def _sync_file(
+    source: Path,
+    destination: Path,
+    source_stat: os.stat_result,
+    destination_stat: os.stat_result | None,
+    checksum: bool,
+    block_size: int | None,
+    dry_run: bool,
+) -> tuple[str, int]:
+    """Bring a file up to date, returning what was done and the bytes written."""
+    if destination_stat is not None:
+        looks_equal = destination_stat.st_size == source_stat.st_size and int(
+            destination_stat.st_mtime
+        ) == int(source_stat.st_mtime)
+        if looks_equal and not checksum:
+            return "unchanged", 0
+        target = None if block_size is None else destination
+        if target is not None and not dry_run:
+            # Patch a reflinked copy, which is replaced atomically. Only patch the
+            # file itself if that is impossible, and never through hard links
+            # (e.g. to a blob store) or into read-only files.
+            target = destination.with_name(
+                f".{destination.name}.{uuid.uuid4().hex}.tmp"
+            )
+            if not _reflink(destination, target):
+                writable = os.access(destination, os.W_OK)
+                target = (
+                    destination if destination_stat.st_nlink == 1 and writable else None
+                )
+        if target is not None:
+            try:
+                n_bytes = _patch_file(source, target, cast(int, block_size), dry_run)
+                if not dry_run:
+                    shutil.copystat(source, target)
+                    if target != destination:
+                        os.replace(target, destination)
+            except BaseException:
+                if target != destination:
+                    target.unlink(missing_ok=True)
+                raise
+            if n_bytes == 0 and destination_stat.st_size == source_stat.st_size:
+                return "unchanged", 0
+            return "updated", n_bytes
+        if looks_equal and filecmp.cmp(source, destination, shallow=False):
+            return "unchanged", 0
+    if not dry_run:
+        tmp_path = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copy2(source, tmp_path)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+    return "copied", source_stat.st_size
+
+
+def _patch_file(source: Path, destination: Path, block_size: int, dry_run: bool) -> int:
+    """Overwrite the blocks of `destination` differing from `source`."""
+    n_bytes = 0
+    offset = 0
+    with source.open("rb") as src, destination.open("rb" if dry_run else "r+b") as dst:
+        while block := src.read(block_size):
+            if dst.read(len(block)) != block:
+                n_bytes += len(block)
+                if not dry_run:
+                    dst.seek(offset)
+                    dst.write(block)
+            offset += len(block)
+        if not dry_run:
+            dst.truncate(offset)
+    return n_bytes
@@ -0,0 +1,329 @@
+"""
+Walking directory trees: unique directories, their content and disk usage.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import heapq
+import os
+import stat
+import string
+import uuid
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pyiron_snippets.files._util import _parallel_map
+
+if TYPE_CHECKING:
+    from pyiron_snippets.files.directory import DirectoryObject
+
+
+def _unique_directory_path(parent: Path, shard_levels: int, shard_width: int) -> Path:
+    name = uuid.uuid4().hex
+    shards = [
+        name[i * shard_width : (i + 1) * shard_width] for i in range(shard_levels)
+    ]
+    return parent.joinpath(*shards, f"data_{name}")
+
+
+def _directory_path(directory: str | Path | DirectoryObject) -> Path:
+    from pyiron_snippets.files.directory import DirectoryObject  # Imports this module
+
+    return directory.path if isinstance(directory, DirectoryObject) else Path(directory)
+
+
+def iter_unique_directories(
+    directory: str | Path, shard_levels: int = 0, shard_width: int = 2
+) -> Iterator[Path]:
+    """
+    Find the unique directories created with the given sharding.
+
+    Only the shard directories are visited, with :func:`os.scandir`, so neither
+    the unique directories nor anything else in between has to be stat'ed.
+
+    Args:
+        directory (str | Path): Where the unique directories were created.
+        shard_levels (int): The levels of shard directories.
+        shard_width (int): The hex digits per shard level.
+
+    Yields:
+        Path: The unique directories.
+    """
+    folders = [(str(directory), 0)]
+    while folders:
+        folder, level = folders.pop()
+        try:
+            entries = os.scandir(folder)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                if level == shard_levels:
+                    if entry.name.startswith("data_"):
+                        yield Path(entry.path)
+                elif len(entry.name) == shard_width and all(
+                    c in string.hexdigits for c in entry.name
+                ):
+                    folders.append((entry.path, level + 1))
+
+
+_CATEGORIES = (
+    "dir",
+    "file",
+    "mount",
+    "symlink",
+    "block_device",
+    "char_device",
+    "fifo",
+    "socket",
+)
+
+
+_SPECIAL_CATEGORIES = (
+    ("block_device", stat.S_ISBLK),
+    ("char_device", stat.S_ISCHR),
+    ("fifo", stat.S_ISFIFO),
+    ("socket", stat.S_ISSOCK),
+)
+
+
+def iter_folder_items(folder_path: str | Path) -> Iterator[tuple[str, str]]:
+    """
+    Stream the `(category, path)` pairs of the immediate children of a folder.
+
+    The folder is read in a single :func:`os.scandir` pass, so the file type cached
+    on each directory entry is used instead of separate stat calls. Regular files
+    and directories are thus categorized without touching the filesystem again;
+    only directories (for mount detection) and special files need a stat.
+
+    An entry may be yielded under several categories, e.g. a symlink to a file is
+    both a `"file"` and a `"symlink"`, just like the corresponding
+    :class:`pathlib.Path` `is_*` checks.
+
+    Args:
+        folder_path (str | Path): The folder to inspect.
+
+    Yields:
+        tuple[str, str]: The category and path of each item.
+    """
+    folder_path = Path(folder_path)
+    if not folder_path.is_dir():
+        return
+    base = "" if str(folder_path) == "." else str(folder_path)
+    for category, entry in _iter_entry_categories(folder_path):
+        yield category, os.path.join(base, entry.name)
+
+
+def _iter_entry_categories(
+    folder_path: Path,
+) -> Iterator[tuple[str, os.DirEntry[str]]]:
+    parent_stat = None
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            is_symlink = entry.is_symlink()
+            is_dir = entry.is_dir()
+            is_file = entry.is_file()
+            if is_dir:
+                yield "dir", entry
+            if is_file:
+                yield "file", entry
+            if is_dir and not is_symlink:
+                if os.name == "nt":
+                    is_mount = os.path.ismount(entry.path)
+                else:
+                    if parent_stat is None:
+                        parent_stat = os.stat(folder_path)
+                    st = entry.stat(follow_symlinks=False)
+                    is_mount = (
+                        st.st_dev != parent_stat.st_dev
+                        or st.st_ino == parent_stat.st_ino
+                    )
+                if is_mount:
+                    yield "mount", entry
+            if is_symlink:
+                yield "symlink", entry
+            if not is_dir and not is_file:
+                try:
+                    mode = entry.stat().st_mode
+                except OSError:  # e.g. a dangling symlink
+                    continue
+                for category, check in _SPECIAL_CATEGORIES:
+                    if check(mode):
+                        yield category, entry
+
+
+def categorize_folder_items(folder_path: str | Path) -> dict[str, list[str]]:
+    """
+    Sort the immediate children of a folder by their type.
+
+    Args:
+        folder_path (str | Path): The folder to inspect.
+
+    Returns:
+        dict[str, list[str]]: The paths of the items in each category, or an empty
+            dictionary if the folder is not a directory.
+    """
+    if not Path(folder_path).is_dir():
+        return {}
+    results: dict[str, list[str]] = {t: [] for t in _CATEGORIES}
+    for category, path in iter_folder_items(folder_path):
+        results[category].append(path)
+    return results
+
+
+@dataclasses.dataclass(frozen=True)
+class FileRecord:
+    """A file found by :meth:`DirectoryObject.iter_files`."""
+
+    path: str
+    size: int
+    mtime: float
+
+
+@dataclasses.dataclass(frozen=True)
+class DiskUsage:
+    """The result of :meth:`DirectoryObject.disk_usage`."""
+
+    bytes: int = 0
+    allocated: int = 0
+    files: int = 0
+    largest: tuple[FileRecord, ...] = ()
+
+    @classmethod
+    def combine(cls, usages: Iterable[DiskUsage], n_largest: int = 10) -> DiskUsage:
+        """
+        The total of several usages, e.g. from :func:`measure_disk_usage`.
+
+        Args:
+            usages (Iterable[DiskUsage]): What to add up.
+            n_largest (int): How many of the largest files to keep. (Default is
+                10.)
+
+        Returns:
+            DiskUsage: The total.
+        """
+        usages = list(usages)
+        return cls(
+            bytes=sum(usage.bytes for usage in usages),
+            allocated=sum(usage.allocated for usage in usages),
+            files=sum(usage.files for usage in usages),
+            largest=tuple(
+                heapq.nlargest(
+                    n_largest,
+                    (record for usage in usages for record in usage.largest),
+                    key=lambda record: record.size,
+                )
+            ),
+        )
+
+
+def _own_disk_usage(
+    folder: str, n_largest: int, cache: dict | None
+) -> tuple[DiskUsage, list[str]]:
+    """
+    The usage of the files directly in a folder, and its subfolders.
+
+    With a cache, folders whose mtime did not change since they were last scanned
+    are not scanned again.
+    """
+    if cache is not None:
+        mtime = os.stat(folder).st_mtime_ns  # Before scanning, to miss no change
+        cached = cache.get(folder)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+    records = []
+    subfolders = []
+    allocated = 0
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat_result = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:  # Removed while walking
+                continue
+            records.append(
+                FileRecord(entry.path, stat_result.st_size, stat_result.st_mtime)
+            )
+            allocated += (
+                stat_result.st_blocks * 512  # Not on Windows
+                if hasattr(stat_result, "st_blocks")
+                else stat_result.st_size
+            )
+    usage = DiskUsage(
+        bytes=sum(record.size for record in records),
+        allocated=allocated,
+        files=len(records),
+        largest=tuple(
+            heapq.nlargest(n_largest, records, key=lambda record: record.size)
+        ),
+    )
+    if cache is not None:
+        cache[folder] = (mtime, usage, subfolders)
+    return usage, subfolders
+
+
+def _disk_usage(
+    folder: str, n_largest: int, cache: dict | None, max_workers: int | None = 1
+) -> DiskUsage:
+    """
+    The usage of a folder tree. With several workers, each folder is scanned on
+    the thread pool as soon as it is found, so deep and unbalanced trees are
+    walked in parallel too.
+    """
+    usages = []
+    if max_workers is not None and max_workers <= 1:
+        folders = [folder]
+        while folders:
+            usage, subfolders = _own_disk_usage(folders.pop(), n_largest, cache)
+            usages.append(usage)
+            folders.extend(subfolders)
+        return DiskUsage.combine(usages, n_largest)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_own_disk_usage, folder, n_largest, cache)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                usage, subfolders = future.result()
+                usages.append(usage)
+                pending.update(
+                    executor.submit(_own_disk_usage, subfolder, n_largest, cache)
+                    for subfolder in subfolders
+                )
+    return DiskUsage.combine(usages, n_largest)
+
+
+def measure_disk_usage(
+    directories: Iterable[DirectoryObject | str | Path],
+    n_largest: int = 10,
+    max_workers: int | None = None,
+    cache: dict | None = None,
+) -> dict[Path, DiskUsage]:
+    """
+    The disk usage of many directories, measured in parallel on a thread pool.
+
+    Args:
+        directories (Iterable[DirectoryObject | str | Path]): What to measure.
+        n_largest (int): How many of the largest files to report per directory.
+            (Default is 10.)
+        max_workers (int | None): The number of threads. (Default is None, let
+            :class:`concurrent.futures.ThreadPoolExecutor` decide.)
+        cache (dict | None): See :meth:`DirectoryObject.disk_usage`.
+
+    Returns:
+        dict[Path, DiskUsage]: The usage of each directory, see
+            :meth:`DiskUsage.combine` for the total.
+    """
+    paths = [_directory_path(d) for d in directories]
+    usages = _parallel_map(
+        lambda path: _disk_usage(str(path), n_largest, cache), paths, max_workers
+    )
+    return dict(zip(paths, usages, strict=True))
@@ -0,0 +1,426 @@
+"""
+Watching directories and files for changes, with inotify where available.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import ctypes
+import dataclasses
+import itertools
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+from pyiron_snippets.files.tree import _directory_path
+
+if TYPE_CHECKING:
+    from pyiron_snippets.files.directory import DirectoryObject
+
+
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_FILE_CHANGES = (
+    _IN_MODIFY
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+)
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_KINDS = (
+    (_IN_CREATE | _IN_MOVED_TO, "created"),
+    (_IN_MODIFY, "modified"),
+    (_IN_CLOSE_WRITE, "closed_write"),
+    (_IN_DELETE | _IN_MOVED_FROM, "deleted"),
+)
+
+
+class _Inotify:
+    """A minimal ctypes binding of Linux' inotify."""
+
+    _EVENT = struct.Struct("iIII")  # Watch descriptor, mask, cookie, name length
+
+    @staticmethod
+    def is_available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            return hasattr(ctypes.CDLL(None), "inotify_init1")
+        except OSError:
+            return False
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            self._raise("inotify_init1")
+
+    def _raise(self, what: str, path: str | Path | None = None):
+        error = ctypes.get_errno()
+        raise OSError(error, f"{what}: {os.strerror(error)}", path)
+
+    def add_watch(self, path: str | Path, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            self._raise("inotify_add_watch", path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: float | None = None) -> list[tuple[int, int, int, str]]:
+        """
+        Wait for events.
+
+        Args:
+            timeout (float | None): The maximum time to wait in seconds.
+
+        Returns:
+            list[tuple[int, int, int, str]]: The watch descriptor, mask, cookie
+                and file name of each event -- an empty list on timeout.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 2**16)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class _InotifyDispatcher:
+    """
+    A single inotify instance shared by all :meth:`DirectoryObject.follow`
+    generators, so that the per-user limit of inotify instances doesn't limit the
+    number of files followed. A background thread wakes up the subscribers of
+    each changed file.
+    """
+
+    _instance: _InotifyDispatcher | None = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> _InotifyDispatcher | None:
+        """The shared instance, or None if inotify can't be used."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                try:
+                    cls._instance = cls()
+                except OSError:  # E.g. EMFILE, too many inotify instances
+                    return None
+            return cls._instance
+
+    def __init__(self) -> None:
+        self._inotify = _Inotify()
+        self._lock = threading.Lock()
+        self._watches: dict[str, int] = {}
+        self._subscribers: dict[int, dict[str, set[threading.Event]]] = {}
+        threading.Thread(
+            target=self._run, name="InotifyDispatcher", daemon=True
+        ).start()
+
+    def subscribe(self, path: Path) -> threading.Event:
+        """An event set whenever the file changes."""
+        directory = os.path.abspath(path.parent)
+        changed = threading.Event()
+        with self._lock:
+            wd = self._watches.get(directory)
+            if wd is None:
+                wd = self._inotify.add_watch(directory, _IN_FILE_CHANGES)
+                self._watches[directory] = wd
+            self._subscribers.setdefault(wd, {}).setdefault(path.name, set()).add(
+                changed
+            )
+        return changed
+
+    def unsubscribe(self, path: Path, changed: threading.Event):
+        directory = os.path.abspath(path.parent)
+        with self._lock:
+            wd = self._watches[directory]
+            names = self._subscribers[wd]
+            names[path.name].discard(changed)
+            if not names[path.name]:
+                del names[path.name]
+            if not names:
+                del self._subscribers[wd]
+                del self._watches[directory]
+                self._inotify.rm_watch(wd)
+
+    def _run(self):
+        while True:
+            for wd, mask, _, name in self._inotify.read(None):
+                with self._lock:
+                    if mask & _IN_Q_OVERFLOW:  # Events were dropped, wake everyone
+                        for names in self._subscribers.values():
+                            for events in names.values():
+                                for changed in events:
+                                    changed.set()
+                        continue
+                    for changed in self._subscribers.get(wd, {}).get(name, ()):
+                        changed.set()
+
+
+@dataclasses.dataclass(frozen=True)
+class WatchEvent:
+    """
+    A change in a watched directory.
+
+    Attributes:
+        directory (Path): The watched directory.
+        name (str): The name of the changed entry in it.
+        kind (str): "created", "modified", "closed_write" (a file opened for
+            writing was closed) or "deleted". Renames are reported as the old
+            name being deleted and the new one created.
+    """
+
+    directory: Path
+    name: str
+    kind: str
+
+    @property
+    def path(self) -> Path:
+        return self.directory / self.name
+
+
+class DirectoryWatcher:
+    """
+    Watches many directories for changes on a single background thread.
+
+    On Linux, changes are reported by the kernel through inotify, so watching
+    costs no filesystem traffic at all; elsewhere (or with `inotify=False`, e.g.
+    on network filesystems where changes made by other hosts are not reported)
+    the directories are polled instead, and closed writes show up as
+    modifications. The same happens when the kernel drops inotify events because
+    too many queued up: the directories are rescanned and compared with the
+    last snapshots of their entries.
+
+    Events are coalesced and debounced: the same kind of event for the same
+    entry is reported once, and only after the entry has been quiet for
+    `debounce` seconds, so a file written in many small chunks gives a single
+    "modified" event. Only the entries directly in the directories are watched,
+    not those in subdirectories.
+
+    Args:
+        debounce (float): The quiet time in seconds after which the events of an
+            entry are reported. (Default is 0.1.)
+        interval (float): The time in seconds between polls, or between checks
+            for being closed with inotify. (Default is 1.)
+        inotify (bool | None): Whether to use inotify. (Default is None, where
+            available.)
+    """
+
+    def __init__(
+        self,
+        debounce: float = 0.1,
+        interval: float = 1.0,
+        inotify: bool | None = None,
+    ):
+        self.debounce = debounce
+        self.interval = interval
+        if inotify is None:
+            inotify = _Inotify.is_available()
+        self._inotify = _Inotify() if inotify else None
+        self._lock = threading.Lock()
+        self._watches: dict[Path, int] = {}
+        self._directories: dict[int, Path] = {}
+        self._snapshots: dict[Path, dict[str, tuple[int, int]]] = {}
+        self._poll_ids = itertools.count()
+        self._pending: dict[tuple[Path, str], dict[str, None]] = {}
+        self._last_change: dict[tuple[Path, str], float] = {}
+        self._events: queue.SimpleQueue[WatchEvent | None] = queue.SimpleQueue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="DirectoryWatcher", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, directory: str | Path | DirectoryObject):
+        """Start watching a directory."""
+        path = _directory_path(directory)
+        with self._lock:
+            if path in self._watches:
+                return
+            if self._inotify is not None:
+                wd = self._inotify.add_watch(path, _IN_FILE_CHANGES)
+            else:
+                wd = next(self._poll_ids)
+            self._snapshots[path] = self._scan(path)
+            self._watches[path] = wd
+            self._directories[wd] = path
+
+    def remove(self, directory: str | Path | DirectoryObject):
+        """Stop watching a directory."""
+        path = _directory_path(directory)
+        with self._lock:
+            wd = self._watches.pop(path, None)
+            if wd is None:
+                return
+            del self._directories[wd]
+            self._snapshots.pop(path, None)
+            if self._inotify is not None:
+                self._inotify.rm_watch(wd)
+
+    def events(self, timeout: float | None = None) -> Iterator[WatchEvent]:
+        """
+        Yield the events as they are reported.
+
+        Args:
+            timeout (float | None): Stop after this many seconds without an
+                event. (Default is None, only stop once the watcher is closed.)
+
+        Yields:
+            WatchEvent: The changes.
+        """
+        while True:
+            try:
+                event = self._events.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if event is None:
+                return
+            yield event
+
+    def close(self):
+        """Stop the watcher thread, ending :meth:`events`."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
+        self._events.put(None)
+
+    def __enter__(self) -> DirectoryWatcher:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _scan(path: Path) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        with contextlib.suppress(FileNotFoundError), os.scandir(path) as entries:
+            for entry in entries:
+                with contextlib.suppress(FileNotFoundError):
+                    stat_result = entry.stat(follow_symlinks=False)
+                    snapshot[entry.name] = (
+                        stat_result.st_mtime_ns,
+                        stat_result.st_size,
+                    )
+        return snapshot
+
+    def _poll(self):
+        with self._lock:
+            for path in self._snapshots:
+                self._rescan(path)
+
+    def _rescan(self, path: Path):
+        old = self._snapshots[path]
+        new = self._scan(path)
+        for name in old.keys() - new.keys():
+            self._record(path, name, "deleted")
+        for name, state in new.items():
+            if name not in old:
+                self._record(path, name, "created")
+            elif old[name] != state:
+                self._record(path, name, "modified")
+        self._snapshots[path] = new
+
+    def _read_inotify(self, timeout: float):
+        inotify = cast(_Inotify, self._inotify)
+        for wd, mask, _, name in inotify.read(timeout):
+            with self._lock:
+                if mask & _IN_Q_OVERFLOW:  # Events were dropped
+                    for directory in self._snapshots:
+                        self._rescan(directory)
+                    continue
+                path = self._directories.get(wd)
+                if path is None:
+                    continue
+                if mask & _IN_IGNORED:  # The directory is gone
+                    del self._directories[wd]
+                    self._watches.pop(path, None)
+                    self._snapshots.pop(path, None)
+                    continue
+                for flags, kind in _IN_KINDS:
+                    if mask & flags:
+                        self._record(path, name, kind)
+
+    def _record(self, path: Path, name: str, kind: str):
+        self._pending.setdefault((path, name), {})[kind] = None
+        self._last_change[(path, name)] = time.monotonic()
+
+    def _flush(self):
+        now = time.monotonic()
+        with self._lock:
+            quiet = [
+                key
+                for key, last_change in self._last_change.items()
+                if now - last_change >= self.debounce
+            ]
+            for key in quiet:
+                del self._last_change[key]
+                if self._inotify is not None:
+                    self._update_snapshot(*key)
+                for kind in self._pending.pop(key):
+                    self._events.put(WatchEvent(key[0], key[1], kind))
+
+    def _update_snapshot(self, path: Path, name: str):
+        snapshot = self._snapshots.get(path)
+        if snapshot is None:
+            return
+        try:
+            stat_result = os.lstat(path / name)
+        except FileNotFoundError:
+            snapshot.pop(name, None)
+        else:
+            snapshot[name] = (stat_result.st_mtime_ns, stat_result.st_size)
+
+    def _run(self):
+        next_poll = time.monotonic()
+        while not self._closed.is_set():
+            with self._lock:
+                wait = self.interval
+                if self._last_change:
+                    wait = min(
+                        wait,
+                        self.debounce
+                        - (time.monotonic() - min(self._last_change.values())),
+                    )
+            wait = max(wait, 0.0)
+            if self._inotify is not None:
+                self._read_inotify(wait)
+            else:
+                self._closed.wait(min(wait, max(next_poll - time.monotonic(), 0.0)))
+                if time.monotonic() >= next_poll:
+                    self._poll()
+                    next_poll = time.monotonic() + self.interval
+            self._flush()
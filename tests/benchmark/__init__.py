@@ -0,0 +1,3 @@
+"""
+Timing tests, checking that performance-oriented code paths beat naive references.
+"""
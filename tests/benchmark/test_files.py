@@ -0,0 +1,113 @@
+import os
+import random
+import tempfile
+import time
+import timeit
+import unittest
+from pathlib import Path
+
+from pyiron_snippets.files import DirectoryObject, categorize_folder_items
+
+
+def categorize_folder_items_pathlib(folder_path):
+    """The original implementation, one `Path.is_*` call per type and entry."""
+    if not folder_path.is_dir():
+        return {}
+    types = [
+        "dir",
+        "file",
+        "mount",
+        "symlink",
+        "block_device",
+        "char_device",
+        "fifo",
+        "socket",
+    ]
+    results = {t: [] for t in types}
+    for item in folder_path.iterdir():
+        for tt in types:
+            try:
+                if getattr(item, f"is_{tt}")():
+                    results[tt].append(str(item))
+            except NotImplementedError:
+                pass
+    return results
+
+
+class TestCategorizeFolderItems(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        for i in range(5000):
+            (self.root / f"file_{i}.txt").touch()
+        for i in range(500):
+            (self.root / f"dir_{i}").mkdir()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_scandir_beats_pathlib(self):
+        reference = categorize_folder_items_pathlib(self.root)
+        result = categorize_folder_items(self.root)
+        self.assertEqual(
+            {k: sorted(v) for k, v in reference.items()},
+            {k: sorted(v) for k, v in result.items()},
+            msg="The scandir engine must reproduce the pathlib categorization",
+        )
+        t_pathlib = min(
+            timeit.repeat(
+                lambda: categorize_folder_items_pathlib(self.root), number=1, repeat=3
+            )
+        )
+        t_scandir = min(
+            timeit.repeat(
+                lambda: categorize_folder_items(self.root), number=1, repeat=3
+            )
+        )
+        print(
+            f"categorize_folder_items: pathlib {t_pathlib:.4f}s, scandir {t_scandir:.4f}s"
+        )
+        self.assertLess(t_scandir, t_pathlib)
+
+
+class TestParallelCompression(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = DirectoryObject(Path(self._tmp.name) / "job")
+        rng = random.Random(0)
+        words = [rng.randbytes(8).hex() for _ in range(1000)]
+        for i in range(8):
+            self.directory.write(
+                file_name=f"output_{i}.txt",
+                content=" ".join(rng.choices(words, k=200_000)),
+            )
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _time_compression(self, workers):
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            self.directory.compress(workers=workers)
+            timings.append(time.perf_counter() - start)
+            self.directory.decompress()
+        return min(timings)
+
+    def test_scaling(self):
+        n_cores = os.cpu_count() or 1
+        timings = {
+            workers: self._time_compression(workers)
+            for workers in sorted({1, 2, 4, n_cores})
+        }
+        print(
+            "parallel gzip compression: "
+            + ", ".join(f"{w} workers {t:.3f}s" for w, t in timings.items())
+        )
+        if n_cores < 2:
+            self.skipTest("Parallel speed-up needs more than one core")
+        self.assertLess(timings[max(timings)], timings[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,39 @@
+import contextlib
+import datetime
+import errno
+import gc
+import os
 import pickle
+import stat
 import tarfile
+import threading
+import time
 import unittest
+import weakref
 from pathlib import Path
+from unittest import mock
 
-from pyiron_snippets.files import DirectoryObject
+from pyiron_snippets.files import (
+    ARCHIVE_CODECS,
+    ArchiveView,
+    BlobStore,
+    ChecksumMismatchError,
+    DeferredDeleter,
+    DirectoryObject,
+    DirectoryWatcher,
+    DiskUsage,
+    batch,
+    categorize_folder_items,
+    compress_directories,
+    decompress_directories,
+    delete_files_and_directories_recursively,
+    deletion,
+    iter_folder_items,
+    iter_unique_directories,
+    measure_disk_usage,
+    tree,
+    watch,
+)
 
 
 class TestFiles(unittest.TestCase):
@@ -22,6 +52,44 @@ class TestFiles(unittest.TestCase):
         self.assertTrue(str(directory.path).startswith("data"))
         self.assertEqual(len(str(directory.path)), 37)
 
+    def test_sharded_unique_directory(self):
+        directory = DirectoryObject(
+            self.directory, generate_unique_directory=True, shard_levels=2
+        )
+        name = directory.path.name
+        self.assertEqual(
+            directory.path.relative_to(self.directory.path),
+            Path(name[5:7], name[7:9], name),
+        )
+        self.assertEqual(
+            list(iter_unique_directories(self.directory.path, shard_levels=2)),
+            [directory.path],
+        )
+
+    def test_create_unique(self):
+        with mock.patch("os.mkdir", wraps=os.mkdir) as mkdir:
+            directories = DirectoryObject.create_unique(
+                20, self.directory, shard_levels=1, shard_width=1
+            )
+        self.assertEqual(
+            mkdir.call_count,
+            20 + len({d.path.parent for d in directories}),
+            msg="Each shard and directory should be created with a single mkdir",
+        )
+        self.assertEqual(len({d.path for d in directories}), 20)
+        self.assertTrue(all(d.path.is_dir() for d in directories))
+        self.assertTrue(all(len(d.path.parent.name) == 1 for d in directories))
+        self.assertFalse(any(d._protected for d in directories))
+        self.assertCountEqual(
+            iter_unique_directories(self.directory.path, shard_levels=1, shard_width=1),
+            [d.path for d in directories],
+        )
+        self.assertEqual(
+            list(iter_unique_directories(self.directory.path)),
+            [],
+            msg="Looking at the wrong shard level should find nothing",
+        )
+
     def test_protected(self):
         directory = DirectoryObject("protected", protected=True)
         self.assertTrue(directory._protected)
@@ -56,6 +124,51 @@ class TestFiles(unittest.TestCase):
         self.assertTrue(Path("something").exists())
         self.directory = DirectoryObject("something")
 
+    def test_categorize_folder_items(self):
+        self.directory.write(file_name="test.txt", content="something")
+        subdirectory = self.directory.create_subdirectory("sub")
+        link = self.directory.get_path("link.txt")
+        try:
+            link.symlink_to(Path("test.txt"))
+        except (OSError, NotImplementedError):
+            link = None
+        content = {
+            k: [Path(p).name for p in v]
+            for k, v in categorize_folder_items(self.directory.path).items()
+        }
+        self.assertEqual(content["dir"], [subdirectory.path.name])
+        self.assertEqual(content["mount"], [])
+        if link is None:
+            self.assertEqual(content["file"], ["test.txt"])
+        else:
+            self.assertCountEqual(content["file"], ["test.txt", "link.txt"])
+            self.assertEqual(content["symlink"], ["link.txt"])
+        self.assertEqual(
+            categorize_folder_items(self.directory.get_path("test.txt")),
+            {},
+            msg="Non-directories have no content",
+        )
+
+    def test_iter_content(self):
+        for i in range(3):
+            self.directory.write(file_name=f"test{i}.txt", content="something")
+        self.assertCountEqual(
+            list(self.directory.iter_content()),
+            [
+                (category, path)
+                for category, paths in self.directory.list_content().items()
+                for path in paths
+            ],
+            msg="Streaming and listing should agree",
+        )
+        first = next(iter_folder_items(self.directory.path))
+        self.assertEqual(first[0], "file", msg="Should be able to stop early")
+        self.assertEqual(
+            list(iter_folder_items("not_a_directory")),
+            [],
+            msg="Non-existent folders have no content",
+        )
+
     def test_create_subdirectory(self):
         _ = self.directory.create_subdirectory("another_test")
         self.assertTrue(Path("test/another_test").exists())
@@ -64,6 +177,17 @@ class TestFiles(unittest.TestCase):
         self.assertTrue(self.directory.is_empty())
         self.directory.write(file_name="test.txt", content="something")
         self.assertFalse(self.directory.is_empty())
+        self.directory.remove_files("test.txt")
+        subdirectory = self.directory.create_subdirectory("sub")
+        self.assertFalse(self.directory.is_empty(), msg="Folders are content too")
+        self.assertEqual(len(self.directory), 1)
+        subdirectory.delete()
+        self.directory.delete()
+        self.assertTrue(
+            self.directory.is_empty(), msg="A missing directory has no content"
+        )
+        self.assertEqual(len(self.directory), 0)
+        self.directory = DirectoryObject("test")  # Rebuild it so the tearDown works
 
     def test_delete(self):
         self.assertTrue(
@@ -82,6 +206,122 @@ class TestFiles(unittest.TestCase):
         )
         self.directory = DirectoryObject("test")  # Rebuild it so the tearDown works
 
+    def test_delete_recursively(self):
+        outside = DirectoryObject("outside")
+        outside.write(file_name="keep.txt", content="something")
+        for sub in ["a", "a/b", "a/b/c", "d"]:
+            self.directory.path.joinpath(sub).mkdir()
+            self.directory.write(file_name=f"{sub}/test.txt", content="1234")
+        try:
+            self.directory.get_path("a/link").symlink_to(
+                outside.path.resolve(), target_is_directory=True
+            )
+            n_links = 1
+        except (OSError, NotImplementedError):
+            n_links = 0
+        report = self.directory.delete(max_workers=4)
+        self.assertFalse(self.directory.path.exists())
+        self.assertEqual(report.files, 4 + n_links)
+        self.assertEqual(report.directories, 5)
+        self.assertEqual(report.entries, 9 + n_links)
+        self.assertGreaterEqual(report.bytes, 16)
+        self.assertTrue(
+            outside.file_exists("keep.txt"), msg="Symlinks must not be followed"
+        )
+        self.assertEqual(
+            delete_files_and_directories_recursively(self.directory.path).entries,
+            0,
+            msg="Deleting something missing should do nothing",
+        )
+        file_report = delete_files_and_directories_recursively(
+            outside.get_path("keep.txt")
+        )
+        self.assertEqual((file_report.files, file_report.bytes), (1, 9))
+        outside.delete()
+        self.directory = DirectoryObject("test")  # Rebuild it so the tearDown works
+
+    def test_deferred_deletion(self):
+        deleter = DeferredDeleter(trash="trash")
+        DirectoryObject.deferred_deleter = deleter
+        try:
+            directory = DirectoryObject("deferred")
+            directory.write(file_name="test.txt", content="something")
+            directory = None
+            self.assertFalse(
+                Path("deferred").exists(),
+                msg="The directory should be moved out of the way right away",
+            )
+            self.assertTrue(deleter.drain(timeout=10))
+            self.assertEqual(list(Path("trash").iterdir()), [])
+            stats = deleter.stats
+            self.assertEqual(
+                (stats.pending, stats.deleted, stats.bytes_freed, stats.errors),
+                (0, 1, 9, 0),
+            )
+            deleter.close()
+            self.assertIsNone(
+                deleter.submit(self.directory.path),
+                msg="After closing, deletion should be synchronous",
+            )
+            self.assertFalse(self.directory.path.exists())
+            self.assertEqual(deleter.stats.deleted, 2)
+        finally:
+            DirectoryObject.deferred_deleter = None
+            DirectoryObject("trash").delete()
+        self.directory = DirectoryObject("test")  # Rebuild it so the tearDown works
+        deleter_ref = weakref.ref(deleter)
+        deleter = None
+        gc.collect()
+        self.assertIsNone(deleter_ref(), msg="Exit hooks shouldn't keep it alive")
+        self.assertIsNone(weakref.ref(DeferredDeleter())())
+
+    def test_deferred_deletion_abandon(self):
+        started, release = threading.Event(), threading.Event()
+        delete = deletion.delete_files_and_directories_recursively
+
+        def blocking_delete(path, max_workers=None):
+            started.set()
+            release.wait(10)
+            if path.name.startswith("broken"):
+                raise RuntimeError("not an OSError")
+            return delete(path, max_workers)
+
+        deleter = DeferredDeleter(trash="trash")
+        try:
+            with mock.patch.object(
+                deletion,
+                "delete_files_and_directories_recursively",
+                side_effect=blocking_delete,
+            ):
+                for name in ["broken", "a", "b"]:
+                    self.directory.get_path(name).mkdir()
+                    deleter.submit(self.directory.get_path(name))
+                self.assertTrue(started.wait(10))
+                deleter.close(drain=False)
+                self.assertEqual(
+                    deleter.stats.pending, 1, msg="Dropped trees are not pending"
+                )
+                release.set()
+                self.assertTrue(deleter.drain(timeout=10))
+            self.assertEqual(
+                deleter.stats.errors, 1, msg="Any exception counts as an error"
+            )
+            self.assertEqual(
+                len(list(Path("trash").iterdir())),
+                3,
+                msg="The failed and the dropped trees are left behind",
+            )
+            self.assertEqual(deleter.sweep(), 3)
+            self.assertEqual(list(Path("trash").iterdir()), [])
+
+            sibling = self.directory.get_path(f".c.trash_{'0' * 32}")
+            sibling.mkdir()
+            self.assertEqual(DeferredDeleter().sweep(self.directory.path), 1)
+            self.assertFalse(sibling.exists())
+        finally:
+            release.set()
+            DirectoryObject("trash").delete()
+
     def test_remove(self):
         self.directory.write(file_name="test1.txt", content="something")
         self.directory.write(file_name="test2.txt", content="something")
@@ -142,6 +382,913 @@ class TestFiles(unittest.TestCase):
             msg="Archive should be deleted after decompression",
         )
 
+    def test_compress_codecs(self):
+        for codec, archive_codec in ARCHIVE_CODECS.items():
+            with self.subTest(codec=codec):
+                self.directory.write(file_name="test.txt", content="something")
+                self.directory.compress(codec=codec)
+                archive = Path("test").with_suffix(archive_codec.suffix)
+                self.assertTrue(archive.exists())
+                with tarfile.open(archive, "r:*") as f:
+                    self.assertEqual(f.getnames(), ["test.txt"])
+                self.assertTrue(self.directory.is_empty())
+                self.directory.compress(codec="gzip")
+                self.assertFalse(
+                    Path("test.tar.gz").exists() and codec != "gzip",
+                    msg="Any existing archive should prevent compressing again",
+                )
+                self.directory.decompress()
+                self.assertFalse(archive.exists())
+                self.assertTrue(self.directory.file_exists("test.txt"))
+        self.directory.compress(codec="xz", level=1)
+        self.directory.decompress()
+        with self.assertRaises(ValueError):
+            self.directory.compress(codec="not a codec")
+        with self.assertRaises(ValueError):
+            self.directory.compress(codec="tar", level=1)
+        self.assertTrue(self.directory.file_exists("test.txt"))
+
+    def test_compress_in_parallel(self):
+        contents = {f"test{i}.txt": f"something {i}\n" * 50_000 for i in range(4)}
+        for name, content in contents.items():
+            self.directory.write(file_name=name, content=content)
+        self.directory.compress(workers=3)
+        with open("test.tar.gz", "rb") as f:
+            self.assertGreater(
+                f.read().count(b"\x1f\x8b\x08"),
+                1,
+                msg="Blocks should be stored as consecutive gzip members",
+            )
+        self.directory.decompress()
+        for name, content in contents.items():
+            self.assertEqual(self.directory.get_path(name).read_text(), content)
+        with self.assertRaises(ValueError):
+            self.directory.compress(codec="tar", workers=2)
+
+    def test_compress_checkpoints(self):
+        contents = {f"test{i}.txt": f"something {i}\n" * 100_000 for i in range(3)}
+        for name, content in contents.items():
+            self.directory.write(file_name=name, content=content)
+        for codec in ["gzip", "bz2", "xz"]:
+            with self.subTest(codec=codec):
+                self.directory.compress(codec=codec)
+                view = self.directory.open_archive()
+                self.assertGreater(
+                    len(view._checkpoints),
+                    2,
+                    msg="Serial compression should start a new member every MiB",
+                )
+                for name, content in contents.items():
+                    with view.open(name) as f:
+                        self.assertEqual(f.read().decode(), content)
+                self.directory.decompress()
+
+    def _interrupted_streaming_compression(self):
+        original_add = tarfile.TarFile.add
+        n_calls = 0
+
+        def add_and_crash_on_third_file(tar, *args, **kwargs):
+            nonlocal n_calls
+            n_calls += 1
+            original_add(tar, *args, **kwargs)
+            if n_calls == 3:
+                raise RuntimeError("Simulated crash")
+
+        with (
+            mock.patch.object(tarfile.TarFile, "add", add_and_crash_on_third_file),
+            self.assertRaises(RuntimeError),
+        ):
+            self.directory.compress(streaming=True)
+
+    def test_compress_streaming(self):
+        contents = {f"test{i}.txt": f"something {i}" for i in range(4)}
+        for name, content in contents.items():
+            self.directory.write(file_name=name, content=content)
+
+        self._interrupted_streaming_compression()
+        self.assertEqual(
+            len(self.directory),
+            2,
+            msg="Files should be removed as soon as they are safely archived",
+        )
+        self.assertTrue(Path("test.tar.journal").exists())
+        self.directory.compress(codec="xz")
+        self.assertFalse(Path("test.tar.journal").exists())
+        self.assertFalse(
+            Path("test.tar.xz").exists(), msg="Resuming should keep the codec"
+        )
+        self.assertTrue(self.directory.is_empty())
+        with tarfile.open("test.tar.gz", "r:*") as f:
+            self.assertCountEqual(f.getnames(), contents)
+        self.directory.decompress()
+        for name, content in contents.items():
+            self.assertEqual(self.directory.get_path(name).read_text(), content)
+
+        self._interrupted_streaming_compression()
+        self.directory.decompress()
+        self.assertFalse(Path("test.tar.journal").exists())
+        self.assertFalse(Path("test.tar.gz").exists())
+        for name, content in contents.items():
+            self.assertEqual(
+                self.directory.get_path(name).read_text(),
+                content,
+                msg="Decompressing should roll back an interrupted compression",
+            )
+
+    def test_open_archive(self):
+        with self.assertRaises(FileNotFoundError):
+            self.directory.open_archive()
+        with self.assertRaises(ValueError, msg="Unknown suffixes are named"):
+            ArchiveView("test.zip")
+        contents = {
+            "small.txt": b"energy = -1.23",
+            "sub/big.txt": b"trajectory data\n" * 100_000,
+        }
+        for name, content in contents.items():
+            self.directory.path.joinpath(name).parent.mkdir(exist_ok=True)
+            self.directory.write(file_name=name, content=content, mode="wb")
+        for kwargs in [{}, {"workers": 2}, {"streaming": True}, {"codec": "tar"}]:
+            with self.subTest(**kwargs):
+                self.directory.compress(**kwargs)
+                view = self.directory.open_archive()
+                self.assertCountEqual(view.list(), contents)
+                self.assertIn(Path("sub/big.txt"), view)
+                for name, content in contents.items():
+                    self.assertEqual(view.read_bytes(name), content)
+                with view.open("sub/big.txt") as f:
+                    self.assertEqual(f.readline(), b"trajectory data\n")
+                with self.assertRaises(FileNotFoundError):
+                    view.open("not_there.txt")
+                self.directory.decompress()
+                self.assertFalse(view.path.exists())
+                self.assertFalse(Path(f"{view.path}.index").exists())
+        self.directory.compress()
+        Path("test.tar.gz.index").unlink()
+        self.assertEqual(
+            self.directory.open_archive().read_bytes("small.txt"),
+            contents["small.txt"],
+            msg="Archives without an index should be indexed on the fly",
+        )
+        self.directory.decompress()
+
+    def test_compress_globs(self):
+        for name in [
+            "input.txt",
+            "output.log",
+            "sub/output.txt",
+            "sub/output.log",
+            "scratch/output.txt",
+        ]:
+            self.directory.path.joinpath(name).parent.mkdir(exist_ok=True)
+            self.directory.write(file_name=name, content="something")
+        self.directory.compress(
+            exclude_files=[self.directory.get_path("input.txt").resolve()],
+            exclude=["*.log", "scratch"],
+        )
+        with tarfile.open("test.tar.gz", "r:*") as f:
+            self.assertEqual(f.getnames(), ["sub/output.txt"])
+        self.directory.decompress()
+        self.directory.compress(
+            include="sub/*", exclude_files=["sub/../sub/output.log"]
+        )
+        with tarfile.open("test.tar.gz", "r:*") as f:
+            self.assertEqual(f.getnames(), ["sub/output.txt"])
+        self.directory.decompress()
+        self.assertEqual(len(list(self.directory.path.rglob("*.*"))), 5)
+
+    def test_batch_compression(self):
+        directories = [self.directory.create_subdirectory(f"job{i}") for i in range(3)]
+        for directory in directories:
+            directory.write(file_name="test.txt", content="something")
+        directories[0].compress()
+        reports = []
+        results = compress_directories(
+            [*directories[:2], directories[2].path, self.directory.get_path("nope")],
+            max_workers=2,
+            progress=lambda *args: reports.append(args),
+            codec="xz",
+        )
+        self.assertEqual(
+            [r.status for r in results], ["skipped", "done", "done", "failed"]
+        )
+        self.assertIsInstance(results[-1].error, FileNotFoundError)
+        self.assertEqual([r[:2] for r in reports], [(i, 4) for i in range(1, 5)])
+        self.assertTrue(Path("test/job1.tar.xz").exists())
+        self.assertTrue(all(d.is_empty() for d in directories))
+
+        results = decompress_directories([*directories, self.directory])
+        self.assertEqual(
+            [r.status for r in results], ["done", "done", "done", "skipped"]
+        )
+        for directory in directories:
+            self.assertTrue(directory.file_exists("test.txt"))
+
+        results = compress_directories(directories, max_workers=1, codec="nope")
+        self.assertTrue(all(isinstance(r.error, ValueError) for r in results))
+
+        class Unpicklable(Exception):
+            pass
+
+        def fail():
+            raise Unpicklable("local classes can't be pickled")
+
+        error = batch._catch_picklable(fail)
+        self.assertIsInstance(error, RuntimeError)
+        self.assertIn("Unpicklable", str(error))
+
+    def test_snapshots(self):
+        with self.assertRaises(FileNotFoundError):
+            self.directory.restore_snapshot()
+        self.directory.write(file_name="log.txt", content="step 1\n")
+        self.directory.write(file_name="input.txt", content="input")
+        first = self.directory.snapshot()
+        self.directory.write(file_name="log.txt", content="step 2\n", mode="a")
+        self.directory.write(file_name="output.txt", content="result")
+        os.utime(self.directory.get_path("input.txt"), ns=(0, 0))
+        second = self.directory.snapshot(content_hash=True)
+        with tarfile.open(first, "r:*") as f:
+            self.assertCountEqual(f.getnames(), ["log.txt", "input.txt"])
+        with tarfile.open(second, "r:*") as f:
+            self.assertCountEqual(
+                f.getnames(),
+                ["log.txt", "output.txt", "input.txt"],
+                msg="Without a previous hash, touched files count as changed",
+            )
+        os.utime(self.directory.get_path("input.txt"), ns=(10**9, 10**9))
+        third = self.directory.snapshot(content_hash=True, codec="tar")
+        with tarfile.open(third, "r:*") as f:
+            self.assertEqual(
+                f.getnames(), [], msg="Only the content of touched files changed"
+            )
+        self.assertEqual(
+            self.directory.get_path("log.txt").read_text(), "step 1\nstep 2\n"
+        )
+
+        self.directory.remove_files("log.txt", "input.txt", "output.txt")
+        self.directory.restore_snapshot()
+        self.assertEqual(
+            self.directory.get_path("log.txt").read_text(), "step 1\nstep 2\n"
+        )
+        self.assertEqual(self.directory.get_path("input.txt").read_text(), "input")
+        self.assertEqual(self.directory.get_path("output.txt").read_text(), "result")
+        self.directory.restore_snapshot(0)
+        self.assertEqual(self.directory.get_path("log.txt").read_text(), "step 1\n")
+        DirectoryObject("test.snapshots").delete()
+
+    def test_blob_store(self):
+        store = BlobStore("store")
+        jobs = [
+            DirectoryObject(f"job{i}", blob_store=store, protected=False)
+            for i in range(2)
+        ]
+        for job in jobs:
+            job.write(file_name="potential.txt", content="shared")
+        job_files = [job.get_path("potential.txt") for job in jobs]
+        self.assertTrue(os.path.samefile(*job_files))
+        digest = jobs[0].ingest()["potential.txt"]
+        self.assertEqual(store.refcount(digest), 2)
+
+        jobs[1].write(file_name="potential.txt", content=" and private", mode="a")
+        self.assertEqual(job_files[0].read_text(), "shared")
+        self.assertEqual(job_files[1].read_text(), "shared and private")
+        self.assertEqual(store.refcount(digest), 1)
+
+        self.directory.write(file_name="potential.txt", content="shared")
+        self.directory.blob_store = store
+        self.assertEqual(self.directory.ingest(), {"potential.txt": digest})
+        self.assertTrue(
+            os.path.samefile(self.directory.get_path("potential.txt"), job_files[0])
+        )
+        sub = self.directory.create_subdirectory("sub")
+        self.assertIs(sub.blob_store, store)
+        with mock.patch("os.fsync", wraps=os.fsync) as fsync:
+            sub.write_many({"a.txt": "shared", "b.bin": b"new"}, fsync=True)
+        self.assertGreaterEqual(
+            fsync.call_count, 3, msg="Both blobs and the directory are synced"
+        )
+        self.assertTrue(os.path.samefile(sub.get_path("a.txt"), job_files[0]))
+        self.assertEqual(sub.get_path("b.bin").read_bytes(), b"new")
+
+        self.assertEqual(store.gc().files, 0, msg="All blobs are still in use")
+        jobs = sub = None
+        self.directory.remove_files("potential.txt")
+        report = store.gc()
+        self.assertEqual((report.files, report.bytes), (2, 9))
+        self.assertNotIn(digest, store)
+        DirectoryObject("store").delete()
+
+    def test_blob_store_compress_round_trip(self):
+        store = BlobStore("store_round_trip")
+        job = DirectoryObject("job_round_trip", blob_store=store, protected=False)
+        job.write(file_name="out.txt", content="shared")
+        blob = store.blob_path(job.ingest()["out.txt"])
+        job.compress()
+        job.decompress()
+        self.assertEqual(job.get_path("out.txt").stat().st_nlink, 1)
+        job.write(file_name="out.txt", content=" and private", mode="a")
+        self.assertEqual(job.get_path("out.txt").read_text(), "shared and private")
+        self.assertEqual(blob.read_text(), "shared")
+        self.assertTrue(
+            job.get_path("out.txt").stat().st_mode & stat.S_IWUSR,
+            msg="Appended files are private and writable again",
+        )
+        job = None
+        DirectoryObject("store_round_trip").delete()
+
+    def test_clone(self):
+        self.directory.write(file_name="input.txt", content="something")
+        self.directory.write(file_name="big.bin", content=os.urandom(5000), mode="wb")
+        self.directory.path.joinpath("sub/empty").mkdir(parents=True)
+        self.directory.write(file_name="sub/readonly.txt", content="fixed")
+        self.directory.get_path("sub/readonly.txt").chmod(0o444)
+        with contextlib.suppress(OSError, NotImplementedError):
+            self.directory.get_path("link").symlink_to("input.txt")
+
+        clone, report = self.directory.clone("clone", chunk_size=1024)
+        self.assertEqual(clone.path, Path("clone"))
+        self.assertFalse(clone._protected)
+        for name in ["input.txt", "big.bin", "sub/readonly.txt"]:
+            self.assertEqual(
+                clone.get_path(name).read_bytes(),
+                self.directory.get_path(name).read_bytes(),
+            )
+        self.assertTrue(clone.get_path("sub/empty").is_dir())
+        if self.directory.get_path("link").is_symlink():
+            self.assertEqual(os.readlink(clone.get_path("link")), "input.txt")
+        self.assertEqual(report.reflinks + report.hardlinks + report.copies, 3)
+        if report.reflinks == 0:
+            self.assertEqual(report.hardlinks, 1, msg="Read-only files are linked")
+            self.assertEqual(report.bytes_copied, 5009)
+        self.assertEqual(report.skipped, 0)
+        with self.assertRaises(FileExistsError):
+            self.directory.clone(clone)
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "Needs FIFOs")
+    def test_clone_skips_special_files(self):
+        self.directory.write(file_name="input.txt", content="something")
+        os.mkfifo(self.directory.get_path("pipe"))
+        clone, report = self.directory.clone("clone_fifo")
+        self.assertEqual(report.skipped, 1)
+        self.assertEqual(os.listdir(clone.path), ["input.txt"])
+
+    def test_write_and_read_many(self):
+        contents = {f"input_{i}.txt": f"structure {i}" for i in range(20)}
+        contents["data.bin"] = b"\x00\x01"
+        self.directory.write_many(contents, max_workers=4)
+        self.assertEqual(len(self.directory), 21)
+        self.assertEqual(
+            self.directory.read_many(contents, max_workers=4),
+            {
+                name: content.decode() if isinstance(content, bytes) else content
+                for name, content in contents.items()
+            },
+        )
+        self.assertEqual(
+            self.directory.read_many(["data.bin"], binary=True),
+            {"data.bin": b"\x00\x01"},
+        )
+
+        self.directory.write_many(
+            {"input_0.txt": "updated"}, atomic=True, fsync=True, max_workers=1
+        )
+        self.assertEqual(self.directory.get_path("input_0.txt").read_text(), "updated")
+        self.assertEqual(len(self.directory), 21, msg="No temporary files remain")
+        with self.assertRaises(FileNotFoundError):
+            self.directory.write_many({"no/such/folder.txt": "text"}, atomic=True)
+        self.assertEqual(len(self.directory), 21, msg="No temporary files remain")
+        with self.assertRaises(FileNotFoundError):
+            self.directory.read_many(["not_there.txt"])
+
+    def test_map(self):
+        self.directory.write(file_name="traj.txt", content="step 1\nstep 2\nstep 3")
+        with self.directory.map("traj.txt") as mapped:
+            self.assertEqual(mapped[:6], b"step 1")
+            self.assertEqual(bytes(memoryview(mapped)[-6:]), b"step 3")
+            with self.assertRaises(TypeError):
+                mapped[0] = 0
+        self.assertEqual(
+            list(self.directory.iter_lines("traj.txt")),
+            [b"step 1", b"step 2", b"step 3"],
+        )
+        self.assertEqual(
+            list(
+                self.directory.iter_lines("traj.txt", separator=b" ", start=7, end=13)
+            ),
+            [b"step", b"2"],
+        )
+        self.directory.write(file_name="empty.txt", content="")
+        self.assertEqual(list(self.directory.iter_lines("empty.txt")), [])
+
+    def test_iter_files(self):
+        self.directory.write(file_name="big.h5", content="x" * 100)
+        self.directory.write(file_name="small.h5", content="x")
+        self.directory.write(file_name="big.txt", content="x" * 100)
+        sub = self.directory.create_subdirectory("sub")
+        sub.write(file_name="nested.h5", content="x" * 100)
+        skipped = self.directory.create_subdirectory("skipped")
+        skipped.write(file_name="other.h5", content="x" * 100)
+        os.utime(self.directory.get_path("big.h5"), (0, 0))
+
+        def names(**kwargs):
+            return sorted(
+                os.path.relpath(record.path, self.directory.path)
+                for record in self.directory.iter_files(**kwargs)
+            )
+
+        self.assertEqual(
+            names(pattern="*.h5", min_size=10, exclude="skipped"),
+            ["big.h5", os.path.join("sub", "nested.h5")],
+        )
+        self.assertEqual(
+            names(pattern="*.h5", newer_than=datetime.timedelta(hours=1)),
+            [
+                os.path.join("skipped", "other.h5"),
+                "small.h5",
+                os.path.join("sub", "nested.h5"),
+            ],
+        )
+        self.assertEqual(names(pattern="sub/*"), [os.path.join("sub", "nested.h5")])
+        self.assertEqual(names(recursive=False), ["big.h5", "big.txt", "small.h5"])
+        record = next(self.directory.iter_files(pattern="big.h5"))
+        self.assertEqual((record.size, record.mtime), (100, 0))
+
+    def test_disk_usage(self):
+        self.directory.write(file_name="a.txt", content="x" * 10)
+        sub = self.directory.create_subdirectory("sub")
+        sub.write(file_name="b.txt", content="x" * 100)
+        deeper = sub.create_subdirectory("deeper")
+        deeper.write(file_name="c.txt", content="x")
+        cache: dict = {}
+        usage = self.directory.disk_usage(n_largest=2, max_workers=2, cache=cache)
+        self.assertEqual((usage.bytes, usage.files), (111, 3))
+        self.assertEqual(
+            [os.path.basename(record.path) for record in usage.largest],
+            ["b.txt", "a.txt"],
+        )
+
+        with mock.patch("os.scandir", side_effect=AssertionError("Not cached")):
+            self.assertEqual(self.directory.disk_usage(n_largest=2, cache=cache), usage)
+        sub.write(file_name="d.txt", content="x" * 1000)
+        self.assertEqual(
+            self.directory.disk_usage(n_largest=2, cache=cache).bytes,
+            1111,
+            msg="Changed directories are scanned again",
+        )
+
+        siblings = [deeper.create_subdirectory(name) for name in ["x", "y"]]
+        both_scanning = threading.Barrier(2, timeout=10)
+        own_disk_usage = tree._own_disk_usage
+
+        def wait_for_sibling(folder, n_largest, cache):
+            if os.path.basename(folder) in ("x", "y"):
+                both_scanning.wait()
+            return own_disk_usage(folder, n_largest, cache)
+
+        with mock.patch.object(tree, "_own_disk_usage", wait_for_sibling):
+            self.assertEqual(
+                self.directory.disk_usage(max_workers=4).files,
+                4,
+                msg="Nested folders are scanned in parallel too",
+            )
+        self.assertTrue(all(sibling.path.is_dir() for sibling in siblings))
+
+        other = DirectoryObject("other")
+        other.write(file_name="e.txt", content="x" * 5)
+        try:
+            usages = measure_disk_usage([self.directory, "other"])
+            self.assertEqual(usages[Path("other")].bytes, 5)
+            self.assertEqual(DiskUsage.combine(usages.values()).bytes, 1116)
+        finally:
+            other.delete()
+
+    def test_packed_files(self):
+        directory = DirectoryObject("packed", pack_threshold=10)
+        try:
+            directory.write(file_name="small.txt", content="tiny")
+            directory.write(file_name="small.bin", content=b"\x00\x01", mode="wb")
+            directory.write(file_name="big.txt", content="x" * 100)
+            self.assertEqual(
+                sorted(os.listdir(directory.path)),
+                [".packed", ".packed.index", "big.txt"],
+                msg="Small files are packed",
+            )
+            self.assertTrue(directory.file_exists("small.txt"))
+            self.assertFalse(directory.file_exists("missing.txt"))
+            self.assertEqual(
+                sorted(directory.list_content()["file"]),
+                sorted(
+                    os.path.join("packed", name)
+                    for name in ["big.txt", "small.bin", "small.txt"]
+                ),
+            )
+            with directory.open("small.txt") as f:
+                self.assertEqual(f.read(), "tiny")
+            with directory.open("small.bin", "rb") as f:
+                self.assertEqual(f.read(), b"\x00\x01")
+            with directory.open("big.txt") as f:
+                self.assertEqual(f.read(), "x" * 100)
+
+            directory.write(file_name="small.txt", content="new")
+            directory.write(file_name="small.txt", content="er", mode="a")
+            self.assertEqual(
+                directory.get_path("small.txt").read_text(),
+                "newer",
+                msg="Appending unpacks",
+            )
+            self.assertEqual(directory.pack(), 1)
+            self.assertEqual(directory.read_many(["small.txt"]), {"small.txt": "newer"})
+            directory.remove_files("small.bin")
+            self.assertFalse(directory.file_exists("small.bin"))
+
+            directory.unpack()
+            self.assertEqual(
+                sorted(os.listdir(directory.path)), ["big.txt", "small.txt"]
+            )
+            self.assertEqual(directory.get_path("small.txt").read_text(), "newer")
+        finally:
+            directory.delete()
+
+    def test_packed_files_content(self):
+        directory = DirectoryObject("packed", pack_threshold=10)
+        try:
+            for name in ["a.txt", "b.txt", "c.txt"]:
+                directory.write(file_name=name, content=name[0])
+            self.assertEqual(len(directory), 3, msg="Packed files are counted")
+            directory.remove_files("a.txt", "b.txt", "c.txt")
+            self.assertTrue(directory.is_empty())
+            self.assertEqual(len(directory), 0)
+            directory.delete(only_if_empty=True)
+            self.assertFalse(directory.path.exists())
+
+            directory = DirectoryObject("packed_many", pack_threshold=10)
+            directory.write(file_name="small.txt", content="real" * 10)
+            directory.write_many(
+                {"small.txt": "tiny", "more.txt": b"bin", "big.txt": "x" * 100}
+            )
+            self.assertEqual(
+                sorted(os.listdir(directory.path)),
+                [".packed", ".packed.index", "big.txt"],
+                msg="write_many packs small files too",
+            )
+            self.assertEqual(
+                directory.read_many(["small.txt", "more.txt"], binary=True),
+                {"small.txt": b"tiny", "more.txt": b"bin"},
+            )
+            directory.write_many({"more.txt": "x" * 100})
+            self.assertEqual(directory.get_path("more.txt").read_text(), "x" * 100)
+            self.assertEqual(len(directory), 3, msg="Rewritten files are unpacked")
+
+            sub = directory.create_subdirectory("sub")
+            directory.write(file_name="sub/h.txt", content="h")
+            self.assertEqual(len(sub), 1)
+            self.assertEqual(
+                directory.get_path("sub/h.txt").read_text(),
+                "h",
+                msg="Only files directly in the directory are packed",
+            )
+        finally:
+            directory.delete()
+
+    def test_compress_file(self):
+        content = "line\n" * 1000
+        for codec in ARCHIVE_CODECS:
+            with self.subTest(codec=codec):
+                self.directory.write(file_name="out.dat", content=content)
+                if codec == "tar":
+                    with self.assertRaises(ValueError):
+                        self.directory.compress_file("out.dat", codec)
+                    continue
+                compressed = self.directory.compress_file("out.dat", codec, level=1)
+                self.assertFalse(self.directory.file_exists("out.dat"))
+                self.assertLess(compressed.stat().st_size, len(content))
+                with self.directory.open("out.dat") as f:
+                    self.assertEqual(f.readline(), "line\n")
+                    self.assertEqual(f.read(), content[5:])
+                with self.directory.open("out.dat", "rb") as f:
+                    self.assertEqual(f.read(), content.encode())
+                compressed.unlink()
+        self.directory.remove_files("out.dat")
+        with self.assertRaisesRegex(
+            FileNotFoundError, r"no file test[/\\]out\.dat, .*\.gz.* nor packed"
+        ):
+            self.directory.open("out.dat")
+
+    def test_sync_to(self):
+        self.directory.write(file_name="same.txt", content="same")
+        self.directory.write(file_name="big.dat", content="a" * 40 + "b" * 40)
+        sub = self.directory.create_subdirectory("sub")
+        sub.write(file_name="new.txt", content="new")
+        mirror = DirectoryObject("mirror")
+        try:
+            report = self.directory.sync_to(mirror, block_size=20, dry_run=True)
+            self.assertEqual(
+                sorted(report.copied), ["big.dat", "same.txt", "sub/new.txt"]
+            )
+            self.assertTrue(mirror.is_empty(), msg="Dry runs change nothing")
+
+            report = self.directory.sync_to(mirror, block_size=20, max_workers=2)
+            self.assertEqual(report.bytes_transferred, 87)
+            self.assertEqual(mirror.get_path("sub/new.txt").read_text(), "new")
+
+            mirror.write(file_name="extra.txt", content="extra")
+            self.directory.write(file_name="big.dat", content="a" * 40 + "c" * 40)
+            os.utime(self.directory.get_path("big.dat"), (1, 1))
+            report = self.directory.sync_to(mirror, block_size=20, delete=True)
+            self.assertEqual(report.copied, ())
+            self.assertEqual(report.updated, ("big.dat",))
+            self.assertEqual(report.deleted, ("extra.txt",))
+            self.assertEqual(report.unchanged, 2)
+            self.assertEqual(report.bytes_transferred, 40, msg="Only changed blocks")
+            self.assertEqual(
+                mirror.get_path("big.dat").read_text(), "a" * 40 + "c" * 40
+            )
+            self.assertFalse(mirror.file_exists("extra.txt"))
+
+            mirror.write(file_name="same.txt", content="SAME")
+            os.utime(
+                mirror.get_path("same.txt"),
+                (0, os.stat(self.directory.get_path("same.txt")).st_mtime),
+            )
+            self.assertEqual(self.directory.sync_to(mirror).bytes_transferred, 0)
+            report = self.directory.sync_to(mirror, checksum=True, block_size=None)
+            self.assertEqual(report.copied, ("same.txt",))
+            self.assertEqual(mirror.get_path("same.txt").read_text(), "same")
+
+            shared = Path("shared.dat")  # E.g. a blob of another job
+            os.link(mirror.get_path("big.dat"), shared)
+            self.directory.write(file_name="big.dat", content="d" * 80)
+            self.directory.sync_to(mirror, block_size=20)
+            self.assertEqual(mirror.get_path("big.dat").read_text(), "d" * 80)
+            self.assertEqual(
+                shared.read_text(),
+                "a" * 40 + "c" * 40,
+                msg="Hard links (e.g. to blobs) are not written through",
+            )
+        finally:
+            mirror.delete()
+            Path("shared.dat").unlink(missing_ok=True)
+
+    def test_checksums(self):
+        self.directory.write(file_name="a.txt", content="a")
+        sub = self.directory.create_subdirectory("sub")
+        sub.write(file_name="b.txt", content="b")
+        digests = self.directory.checksums(max_workers=2)
+        self.assertEqual(sorted(digests), ["a.txt", "sub/b.txt"])
+        self.assertTrue(self.directory.file_exists(".sha256sums"))
+        self.assertTrue(self.directory.verify().ok)
+        self.assertEqual(
+            self.directory.checksums(), digests, msg="The manifest is not hashed"
+        )
+
+        self.directory.write(file_name="a.txt", content="changed")
+        sub.remove_files("b.txt")
+        report = self.directory.verify()
+        self.assertEqual(report.mismatched, ("a.txt",))
+        self.assertEqual(report.missing, ("sub/b.txt",))
+
+    def test_compress_with_checksums(self):
+        self.directory.write(file_name="data.txt", content="original")
+        self.directory.compress(codec="tar", checksums="sha256")
+        with tarfile.open(self.directory.path.with_suffix(".tar")) as tar:
+            self.assertEqual(tar.getnames(), [".sha256sums", "data.txt"])
+        self.directory.decompress()
+        self.assertEqual(self.directory.get_path("data.txt").read_text(), "original")
+        self.assertTrue(self.directory.verify().ok)
+
+        self.directory.compress(codec="tar", checksums="sha256")
+        tar_path = self.directory.path.with_suffix(".tar")
+        tar_path.write_bytes(tar_path.read_bytes().replace(b"original", b"0riginal"))
+        with self.assertRaises(ChecksumMismatchError) as context:
+            self.directory.decompress()
+        self.assertEqual(context.exception.mismatched, ["data.txt"])
+        self.assertTrue(tar_path.exists(), msg="The archive is kept")
+        error = pickle.loads(pickle.dumps(context.exception))
+        self.assertEqual(error.mismatched, ["data.txt"])
+
+        intact = DirectoryObject("intact")
+        try:
+            intact.write(file_name="data.txt", content="original")
+            intact.compress(codec="tar", checksums="sha256")
+            results = decompress_directories([self.directory, intact], max_workers=1)
+            self.assertEqual(results[0].status, "failed")
+            self.assertIsInstance(results[0].error, ChecksumMismatchError)
+            self.assertEqual(results[1].status, "done")
+        finally:
+            intact.delete()
+        tar_path.unlink()
+
+    def test_watch(self):
+        other = DirectoryObject("other")
+        try:
+            for inotify in {False, watch._Inotify.is_available()}:
+                with (
+                    self.subTest(inotify=inotify),
+                    DirectoryWatcher(
+                        debounce=0.05, interval=0.05, inotify=inotify
+                    ) as watcher,
+                ):
+                    watcher.add(self.directory)
+                    watcher.add(other)
+                    with self.directory.get_path("out.txt").open("w") as f:
+                        for _ in range(100):
+                            f.write("x")
+                            f.flush()
+                    other.write(file_name="done", content="")
+                    events = {
+                        (event.directory, event.name, event.kind)
+                        for event in watcher.events(timeout=0.5)
+                    }
+                    self.assertIn((self.directory.path, "out.txt", "created"), events)
+                    self.assertIn((other.path, "done", "created"), events)
+                    if inotify:
+                        self.assertIn(
+                            (self.directory.path, "out.txt", "closed_write"), events
+                        )
+                    watcher.remove(other)
+                    self.directory.remove_files("out.txt")
+                    other.remove_files("done")
+                    self.assertEqual(
+                        [
+                            (event.name, event.kind)
+                            for event in watcher.events(timeout=0.5)
+                        ],
+                        [("out.txt", "deleted")],
+                    )
+
+            self.directory.write(file_name="out.txt", content="x")
+            events = self.directory.watch(timeout=1, debounce=0.01, interval=0.05)
+            threading.Timer(0.2, self.directory.remove_files, ["out.txt"]).start()
+            self.assertEqual(next(events).kind, "deleted")
+            events.close()
+        finally:
+            other.delete()
+
+    @unittest.skipUnless(watch._Inotify.is_available(), "Needs inotify")
+    def test_watch_overflow(self):
+        read = watch._Inotify.read
+        drop, overflow = threading.Event(), threading.Event()
+
+        def overflowing_read(inotify, timeout=None):
+            if overflow.is_set():
+                overflow.clear()
+                return [(-1, watch._IN_Q_OVERFLOW, 0, "")]
+            events = read(inotify, timeout)
+            return [] if drop.is_set() else events
+
+        self.directory.write(file_name="kept.txt", content="x")
+        self.directory.write(file_name="changed.txt", content="x")
+        with (
+            mock.patch.object(watch._Inotify, "read", overflowing_read),
+            DirectoryWatcher(debounce=0.05, interval=0.05, inotify=True) as watcher,
+        ):
+            watcher.add(self.directory)
+            self.directory.write(file_name="reported.txt", content="x")
+            self.assertIn(
+                ("reported.txt", "created"),
+                {(e.name, e.kind) for e in watcher.events(timeout=0.3)},
+            )
+            drop.set()
+            self.directory.write(file_name="changed.txt", content="xyz")
+            self.directory.write(file_name="new.txt", content="x")
+            self.directory.remove_files("reported.txt")
+            time.sleep(0.2)
+            drop.clear()
+            overflow.set()
+            self.assertEqual(
+                {(e.name, e.kind) for e in watcher.events(timeout=0.3)},
+                {
+                    ("changed.txt", "modified"),
+                    ("new.txt", "created"),
+                    ("reported.txt", "deleted"),
+                },
+                msg="Dropped events are recovered by rescanning",
+            )
+
+    def test_lock(self):
+        with self.directory.lock():
+            self.assertFalse(self.directory.lock().acquire(timeout=0))
+            with self.assertRaises(TimeoutError):
+                self.directory.lock(timeout=0.01).__enter__()
+            self.assertFalse(
+                self.directory.lock(timeout=0.01).acquire(),
+                msg="acquire should default to the timeout of the lock",
+            )
+            with self.directory.lock("a.txt"), self.directory.lock("b.txt"):
+                pass  # Locks on different files are independent
+        self.assertTrue(self.directory._locks_dir().joinpath("a.txt.lock").exists())
+        self.assertFalse(
+            self.directory.get_path(".lock").exists(),
+            msg="Lock files should be kept out of the directory",
+        )
+
+        if os.name == "posix":  # Windows has no shared locks
+            with self.directory.lock("a.txt", shared=True):
+                reader = self.directory.lock("a.txt", shared=True)
+                self.assertTrue(reader.acquire(timeout=0))
+                self.assertFalse(self.directory.lock("a.txt").acquire(timeout=0))
+                reader.release()
+
+        held = self.directory.lock("a.txt")
+        held.acquire()
+        threading.Timer(0.1, held.release).start()
+        with self.directory.lock("a.txt") as waiting:
+            self.assertGreaterEqual(waiting.wait_time, 0.05)
+        stats = self.directory.lock_stats
+        self.assertEqual(stats.contended, 1)
+        self.assertGreaterEqual(stats.max_wait, 0.05)
+        self.assertGreater(stats.acquisitions, stats.contended)
+
+    def test_lock_is_not_content(self):
+        directory = DirectoryObject("test_lock_content")
+        directory.write(file_name="a.txt", content="a")
+        with directory.lock(), directory.lock("a.txt"):
+            self.assertEqual(directory.pack(threshold=1024), 1)
+            directory.compress()
+            self.assertFalse(directory.lock().acquire(timeout=0))
+            self.assertFalse(directory.lock("a.txt").acquire(timeout=0))
+            directory.decompress()
+        self.assertEqual(
+            sorted(os.listdir(directory.path)), [".packed", ".packed.index"]
+        )
+        directory.packed_files.path.unlink()
+        directory.packed_files.index_path.unlink()
+        self.assertTrue(directory.is_empty())
+        locks_dir = directory._locks_dir()
+        directory.delete(only_if_empty=True)
+        self.assertFalse(directory.path.exists())
+        self.assertFalse(locks_dir.exists(), msg="Lock files go with the directory")
+
+    def test_tail(self):
+        self.directory.write(file_name="log.txt", content="1\n2\n3\n4\n")
+        self.assertEqual(self.directory.tail("log.txt", 2), ["3", "4"])
+        self.assertEqual(self.directory.tail("log.txt", 10), ["1", "2", "3", "4"])
+        self.assertEqual(self.directory.tail("log.txt", 0), [])
+
+    def test_follow(self):
+        path = self.directory.get_path("log.txt")
+        for inotify in {False, watch._Inotify.is_available()}:
+            with self.subTest(inotify=inotify):
+                path.write_text("a\n")
+                lines = self.directory.follow(
+                    "log.txt",
+                    interval=0.01,
+                    from_end=False,
+                    timeout=0.1,
+                    inotify=inotify,
+                )
+                self.assertEqual(next(lines), "a")
+                with path.open("a") as f:
+                    f.write("b\nc")
+                self.assertEqual(next(lines), "b", msg="Only complete lines")
+                with path.open("a") as f:
+                    f.write("\n")
+                self.assertEqual(next(lines), "c")
+                path.write_text("x\n")
+                self.assertEqual(next(lines), "x", msg="Truncation")
+                with path.open("a") as f:
+                    f.write("y\n")
+                with path.open("a") as f:
+                    f.write("unterminated")
+                self.assertEqual(next(lines), "y")
+                rotated = self.directory.get_path("log.txt.new")
+                rotated.write_text("r\n")
+                os.replace(rotated, path)
+                self.assertEqual(next(lines), "unterminated", msg="Rotation")
+                self.assertEqual(next(lines), "r", msg="Rotation")
+                self.assertEqual(list(lines), [], msg="Timeout")
+
+    def test_follow_shares_inotify(self):
+        if not watch._Inotify.is_available():
+            self.skipTest("inotify is only available on Linux")
+        self.directory.write(file_name="log.txt", content="first\n")
+        followers = [
+            self.directory.follow("log.txt", interval=10, from_end=False, timeout=10)
+            for _ in range(200)  # More than the default max_user_instances
+        ]
+        for follower in followers:
+            self.assertEqual(next(follower), "first")
+        self.assertEqual(len(watch._InotifyDispatcher.get()._watches), 1)
+        self.directory.write(file_name="log.txt", content="second\n", mode="a")
+        for follower in followers:
+            self.assertEqual(next(follower), "second")
+            follower.close()
+        self.assertEqual(watch._InotifyDispatcher.get()._watches, {})
+
+        def out_of_instances():
+            # A new error each time, a shared one would keep its frames alive
+            raise OSError(errno.EMFILE, "inotify_init1")
+
+        with (
+            mock.patch.object(watch._InotifyDispatcher, "_instance", None),
+            mock.patch.object(watch, "_Inotify", side_effect=out_of_instances),
+        ):
+            lines = self.directory.follow("log.txt", interval=0.01, timeout=0.1)
+            threading.Timer(
+                0.05, self.directory.write, ["log.txt", "polled\n", "a"]
+            ).start()
+            self.assertEqual(next(lines), "polled", msg="Falls back to polling")
+            lines.close()
+
 
 if __name__ == "__main__":
     unittest.main()